@@ -0,0 +1,159 @@
+"""Esquema inicial del servicio de tienda
+
+Tablas e índices tal como los creaba create_all antes de introducir las
+migraciones. Si la tabla clientes ya existe, la base de datos se creó con
+create_all al arrancar el servicio: la revisión no hace nada y las
+siguientes completan lo que falte.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15
+
+"""
+import sqlalchemy as sa
+from alembic import context, op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table("clientes"):
+        return
+    
+    op.create_table(
+        "clientes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("codigo_cliente", sa.String(50), nullable=False),
+        sa.Column("nombre", sa.String(255), nullable=False),
+        sa.Column("email", sa.String(255)),
+        sa.Column("telefono", sa.String(50)),
+        sa.Column("direccion", sa.Text()),
+        sa.Column("ciudad", sa.String(100)),
+        sa.Column("pais", sa.String(50)),
+        sa.Column("tipo_cliente", sa.String(50)),
+        sa.Column("limite_credito", sa.Numeric(12, 2)),
+        sa.Column("descuento_porcentaje", sa.Numeric(5, 2)),
+        sa.Column("activo", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.current_timestamp()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.current_timestamp()),
+    )
+    op.create_index("ix_clientes_id", "clientes", ["id"])
+    op.create_index("ix_clientes_codigo_cliente", "clientes", ["codigo_cliente"], unique=True)
+    op.create_index("ix_clientes_email", "clientes", ["email"])
+    op.create_index("ix_clientes_activo", "clientes", ["activo"])
+
+    op.create_table(
+        "pedidos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("numero_pedido", sa.String(50), nullable=False),
+        sa.Column("cliente_id", sa.Integer(), sa.ForeignKey("clientes.id"), nullable=False),
+        sa.Column("fecha_pedido", sa.DateTime(), server_default=sa.func.current_timestamp()),
+        sa.Column("fecha_requerida", sa.Date()),
+        sa.Column("fecha_prometida", sa.Date()),
+        sa.Column("fecha_entrega", sa.DateTime()),
+        sa.Column("estado", sa.String(50), nullable=False),
+        sa.Column("subtotal", sa.Numeric(12, 2)),
+        sa.Column("descuento", sa.Numeric(12, 2)),
+        sa.Column("impuestos", sa.Numeric(12, 2)),
+        sa.Column("total", sa.Numeric(12, 2)),
+        sa.Column("metodo_pago", sa.String(50)),
+        sa.Column("almacen_origen_id", sa.Integer()),
+        sa.Column("direccion_entrega", sa.Text()),
+        sa.Column("observaciones", sa.Text()),
+        sa.Column("prioridad", sa.String(20)),
+        sa.Column("usuario_creacion", sa.String(255)),
+        sa.Column("usuario_aprobacion", sa.String(255)),
+        sa.Column("fecha_aprobacion", sa.DateTime()),
+        sa.Column("motivo_cancelacion", sa.Text()),
+    )
+    op.create_index("ix_pedidos_id", "pedidos", ["id"])
+    op.create_index("ix_pedidos_numero_pedido", "pedidos", ["numero_pedido"], unique=True)
+    op.create_index("ix_pedidos_cliente_id", "pedidos", ["cliente_id"])
+    op.create_index("ix_pedidos_estado", "pedidos", ["estado"])
+    op.create_index("ix_pedidos_prioridad", "pedidos", ["prioridad"])
+
+    op.create_table(
+        "pedido_detalles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("pedido_id", sa.Integer(), sa.ForeignKey("pedidos.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("producto_id", sa.Integer(), nullable=False),
+        sa.Column("cantidad", sa.Numeric(10, 2), nullable=False),
+        sa.Column("precio_unitario", sa.Numeric(10, 2), nullable=False),
+        sa.Column("descuento_linea", sa.Numeric(10, 2)),
+        sa.Column("subtotal_linea", sa.Numeric(12, 2), nullable=False),
+    )
+    op.create_index("ix_pedido_detalles_id", "pedido_detalles", ["id"])
+
+    op.create_table(
+        "envios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("numero_envio", sa.String(50), nullable=False),
+        sa.Column("pedido_id", sa.Integer(), sa.ForeignKey("pedidos.id"), nullable=False),
+        sa.Column("transportista", sa.String(255)),
+        sa.Column("vehiculo", sa.String(100)),
+        sa.Column("conductor", sa.String(255)),
+        sa.Column("telefono_conductor", sa.String(50)),
+        sa.Column("fecha_programada", sa.DateTime()),
+        sa.Column("fecha_salida", sa.DateTime()),
+        sa.Column("fecha_entrega", sa.DateTime()),
+        sa.Column("estado", sa.String(50)),
+        sa.Column("observaciones", sa.Text()),
+        sa.Column("costo_envio", sa.Numeric(10, 2)),
+    )
+    op.create_index("ix_envios_id", "envios", ["id"])
+    op.create_index("ix_envios_numero_envio", "envios", ["numero_envio"], unique=True)
+    op.create_index("ix_envios_pedido_id", "envios", ["pedido_id"])
+    op.create_index("ix_envios_estado", "envios", ["estado"])
+
+    op.create_table(
+        "devoluciones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("numero_devolucion", sa.String(50), nullable=False, unique=True),
+        sa.Column("pedido_id", sa.Integer(), sa.ForeignKey("pedidos.id"), nullable=False),
+        sa.Column("envio_id", sa.Integer(), sa.ForeignKey("envios.id")),
+        sa.Column("fecha_devolucion", sa.DateTime(), server_default=sa.func.current_timestamp()),
+        sa.Column("motivo", sa.String(100), nullable=False),
+        sa.Column("descripcion", sa.Text()),
+        sa.Column("estado", sa.String(50)),
+        sa.Column("usuario_procesamiento", sa.String(255)),
+        sa.Column("fecha_procesamiento", sa.DateTime()),
+    )
+    op.create_index("ix_devoluciones_id", "devoluciones", ["id"])
+
+    op.create_table(
+        "devolucion_detalles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("devolucion_id", sa.Integer(), sa.ForeignKey("devoluciones.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("producto_id", sa.Integer(), nullable=False),
+        sa.Column("cantidad_devuelta", sa.Numeric(10, 2), nullable=False),
+        sa.Column("motivo_detalle", sa.String(100)),
+        sa.Column("estado_producto", sa.String(50)),
+        sa.Column("accion", sa.String(50)),
+    )
+    op.create_index("ix_devolucion_detalles_id", "devolucion_detalles", ["id"])
+
+    op.create_table(
+        "reservas_stock",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("pedido_id", sa.Integer(), sa.ForeignKey("pedidos.id"), nullable=False),
+        sa.Column("producto_id", sa.Integer(), nullable=False),
+        sa.Column("cantidad_reservada", sa.Numeric(10, 2), nullable=False),
+        sa.Column("almacen_id", sa.Integer(), nullable=False),
+        sa.Column("fecha_reserva", sa.DateTime(), server_default=sa.func.current_timestamp()),
+        sa.Column("fecha_expiracion", sa.DateTime()),
+        sa.Column("activa", sa.Boolean()),
+    )
+    op.create_index("ix_reservas_stock_id", "reservas_stock", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("reservas_stock")
+    op.drop_table("devolucion_detalles")
+    op.drop_table("devoluciones")
+    op.drop_table("envios")
+    op.drop_table("pedido_detalles")
+    op.drop_table("pedidos")
+    op.drop_table("clientes")
@@ -0,0 +1,117 @@
+"""Tipos enumerados, índices compuestos y secuencias de numeración
+
+- Convierte las columnas de estado, tipo, prioridad y acción a tipos ENUM
+  nativos; una fila con un valor fuera del tipo hace fallar la migración.
+- Sustituye los índices simples de estado y cliente/pedido por índices
+  compuestos y añade los de paginación por (fecha, id), el índice parcial de
+  reservas activas y el índice trigram de búsqueda de clientes.
+- Crea las secuencias de numeración alineadas con los números ya emitidos.
+
+Los tipos ENUM, pg_trgm y las secuencias solo existen en PostgreSQL; en otros
+motores esas partes se omiten. Cada paso admite que el objeto ya exista o ya
+falte, porque las bases creadas con create_all pueden tener parte de este
+esquema.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+ENUMS = (
+    ("clientes", "tipo_cliente", 50, sa.Enum("minorista", "mayorista", "corporativo", "distribuidor", name="tipo_cliente_enum")),
+    ("pedidos", "estado", 50, sa.Enum("borrador", "pendiente", "confirmado", "preparando", "enviado", "entregado",
+                                      "cancelado", "fallido", name="estado_pedido_enum")),
+    ("pedidos", "prioridad", 20, sa.Enum("baja", "normal", "alta", "urgente", name="prioridad_pedido_enum")),
+    ("envios", "estado", 50, sa.Enum("programado", "en_transito", "entregado", "devuelto", "cancelado", name="estado_envio_enum")),
+    ("devoluciones", "estado", 50, sa.Enum("recibida", "inspeccionada", "aprobada", "rechazada", "procesada",
+                                           name="estado_devolucion_enum")),
+    ("devolucion_detalles", "estado_producto", 50, sa.Enum("bueno", "dañado", "vencido", "defectuoso", name="estado_producto_enum")),
+    ("devolucion_detalles", "accion", 50, sa.Enum("reintegrar_inventario", "descarte", "reparacion", "devolver_proveedor",
+                                                  name="accion_devolucion_enum")),
+)
+
+NUMERACIONES = (
+    ("pedido_numero_seq", "pedidos", "numero_pedido"),
+    ("envio_numero_seq", "envios", "numero_envio"),
+    ("devolucion_numero_seq", "devoluciones", "numero_devolucion"),
+)
+
+BUSQUEDA_CLIENTES = "(nombre || ' ' || codigo_cliente || ' ' || coalesce(email, '')) gin_trgm_ops"
+
+
+def _es_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    op.drop_index("ix_pedidos_cliente_id", table_name="pedidos", if_exists=True)
+    op.drop_index("ix_pedidos_estado", table_name="pedidos", if_exists=True)
+    op.drop_index("ix_envios_pedido_id", table_name="envios", if_exists=True)
+    op.drop_index("ix_envios_estado", table_name="envios", if_exists=True)
+
+    if _es_postgres():
+        bind = op.get_bind()
+        for tabla, columna, _, tipo in ENUMS:
+            tipo.create(bind, checkfirst=True)
+            op.alter_column(tabla, columna, type_=tipo, postgresql_using=f"{columna}::{tipo.name}")
+
+    op.create_index("ix_pedidos_cliente_estado", "pedidos", ["cliente_id", "estado"], if_not_exists=True)
+    op.create_index("ix_pedidos_estado_fecha", "pedidos", ["estado", "fecha_pedido"], if_not_exists=True)
+    op.create_index("ix_pedidos_fecha_id", "pedidos", ["fecha_pedido", "id"], if_not_exists=True)
+    op.create_index("ix_envios_pedido_estado", "envios", ["pedido_id", "estado"], if_not_exists=True)
+    op.create_index("ix_envios_fecha_id", "envios", ["fecha_programada", "id"], if_not_exists=True)
+    op.create_index("ix_clientes_created_id", "clientes", ["created_at", "id"], if_not_exists=True)
+    op.create_index("ix_devoluciones_fecha_id", "devoluciones", ["fecha_devolucion", "id"], if_not_exists=True)
+    op.create_index(
+        "ix_reservas_stock_pedido_activa", "reservas_stock", ["pedido_id"],
+        postgresql_where=sa.text("activa"), sqlite_where=sa.text("activa"), if_not_exists=True,
+    )
+
+    if _es_postgres():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            "ix_clientes_busqueda_trgm", "clientes", [sa.text(BUSQUEDA_CLIENTES)],
+            postgresql_using="gin", if_not_exists=True,
+        )
+        for secuencia, tabla, columna in NUMERACIONES:
+            op.execute(sa.schema.CreateSequence(sa.Sequence(secuencia), if_not_exists=True))
+            op.execute(
+                f"SELECT setval('{secuencia}', m) FROM ("
+                f"SELECT MAX(CAST(substring({columna} FROM '[0-9]+$') AS BIGINT)) AS m FROM {tabla}"
+                f") ultimo WHERE m >= (SELECT last_value FROM {secuencia})"
+            )
+
+
+def downgrade() -> None:
+    if _es_postgres():
+        for secuencia, _, _ in NUMERACIONES:
+            op.execute(sa.schema.DropSequence(sa.Sequence(secuencia)))
+        op.drop_index("ix_clientes_busqueda_trgm", table_name="clientes")
+
+    op.drop_index("ix_reservas_stock_pedido_activa", table_name="reservas_stock")
+    op.drop_index("ix_devoluciones_fecha_id", table_name="devoluciones")
+    op.drop_index("ix_clientes_created_id", table_name="clientes")
+    op.drop_index("ix_envios_fecha_id", table_name="envios")
+    op.drop_index("ix_envios_pedido_estado", table_name="envios")
+    op.drop_index("ix_pedidos_fecha_id", table_name="pedidos")
+    op.drop_index("ix_pedidos_estado_fecha", table_name="pedidos")
+    op.drop_index("ix_pedidos_cliente_estado", table_name="pedidos")
+
+    if _es_postgres():
+        bind = op.get_bind()
+        for tabla, columna, longitud, tipo in ENUMS:
+            op.alter_column(tabla, columna, type_=sa.String(longitud), postgresql_using=f"{columna}::text")
+            tipo.drop(bind, checkfirst=True)
+
+    op.create_index("ix_envios_estado", "envios", ["estado"])
+    op.create_index("ix_envios_pedido_id", "envios", ["pedido_id"])
+    op.create_index("ix_pedidos_estado", "pedidos", ["estado"])
+    op.create_index("ix_pedidos_cliente_id", "pedidos", ["cliente_id"])
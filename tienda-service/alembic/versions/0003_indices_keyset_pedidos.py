@@ -0,0 +1,29 @@
+"""Índices de paginación por cursor en pedidos filtrados
+
+Los listados por estado o por cliente ordenan por (fecha_pedido, id); los
+índices incluyen ambas columnas tras el filtro para leer cada página sin
+ordenar ni saltar filas.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15
+
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_pedidos_estado_fecha_id", "pedidos", ["estado", "fecha_pedido", "id"], if_not_exists=True)
+    op.create_index("ix_pedidos_cliente_fecha_id", "pedidos", ["cliente_id", "fecha_pedido", "id"], if_not_exists=True)
+    op.drop_index("ix_pedidos_estado_fecha", table_name="pedidos", if_exists=True)
+
+
+def downgrade() -> None:
+    op.create_index("ix_pedidos_estado_fecha", "pedidos", ["estado", "fecha_pedido"])
+    op.drop_index("ix_pedidos_cliente_fecha_id", table_name="pedidos")
+    op.drop_index("ix_pedidos_estado_fecha_id", table_name="pedidos")
@@ -0,0 +1,36 @@
+"""Marca de actualización en pedidos, envíos y devoluciones
+
+Las filas existentes toman la hora de la migración. Con updated_at el ETag de
+estos recursos se calcula sin serializar la respuesta, igual que en clientes.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15
+
+"""
+import sqlalchemy as sa
+from alembic import context, op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLAS = ("pedidos", "envios", "devoluciones")
+
+
+def _tiene_columna(tabla: str) -> bool:
+    if context.is_offline_mode():
+        return False
+    return any(columna["name"] == "updated_at" for columna in sa.inspect(op.get_bind()).get_columns(tabla))
+
+
+def upgrade() -> None:
+    for tabla in TABLAS:
+        if not _tiene_columna(tabla):
+            op.add_column(tabla, sa.Column("updated_at", sa.DateTime(), server_default=sa.func.current_timestamp()))
+
+
+def downgrade() -> None:
+    for tabla in TABLAS:
+        op.drop_column(tabla, "updated_at")
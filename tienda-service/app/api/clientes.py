@@ -10,10 +10,14 @@
 # ============================================================================
 
 from typing import Optional
-from fastapi import APIRouter, Depends, Query
+from decimal import Decimal
+from fastapi import APIRouter, Depends, Query, Request, BackgroundTasks
 from sqlalchemy.orm import Session
 
+from ..cache import lista_swr
 from ..database import get_db
+from ..dependencies import rate_limit_by_page_size
+from ..middleware.http_cache import etag_response
 from ..services.cliente_service import ClienteService
 from ..dtos.cliente_dto import (
     ClienteCreateDTO, ClienteUpdateDTO, 
@@ -22,82 +26,89 @@ from ..dtos.cliente_dto import (
 
 router = APIRouter()
 
+def get_cliente_service(db: Session = Depends(get_db)) -> ClienteService:
+    """Dependencia para obtener el servicio de clientes"""
+    return ClienteService(db)
+
 @router.post("/", response_model=ClienteResponseDTO, status_code=201)
 def crear_cliente(
     cliente_data: ClienteCreateDTO,
-    db: Session = Depends(get_db)
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Crear un nuevo cliente"""
-    cliente_service = ClienteService(db)
     return cliente_service.crear_cliente(cliente_data)
 
 @router.get("/{cliente_id}", response_model=ClienteResponseDTO)
 def obtener_cliente(
     cliente_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Obtener un cliente por ID"""
-    cliente_service = ClienteService(db)
-    return cliente_service.obtener_cliente(cliente_id)
+    return etag_response(request, cliente_service.obtener_cliente(cliente_id))
 
 @router.get("/codigo/{codigo_cliente}", response_model=ClienteResponseDTO)
 def obtener_cliente_por_codigo(
     codigo_cliente: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Obtener un cliente por código"""
-    cliente_service = ClienteService(db)
-    return cliente_service.obtener_cliente_por_codigo(codigo_cliente)
+    return etag_response(request, cliente_service.obtener_cliente_por_codigo(codigo_cliente))
 
-@router.get("/", response_model=ClienteListResponseDTO)
+@router.get("/", response_model=ClienteListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(100))])
 def listar_clientes(
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
+    page_size: int = Query(100, ge=1, le=500, description="Tamaño de página (máximo 500)"),
     activo: Optional[bool] = Query(None, description="Filtrar por estado activo"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
     db: Session = Depends(get_db)
 ):
     """Listar clientes con paginación"""
-    cliente_service = ClienteService(db)
-    return cliente_service.listar_clientes(page, page_size, activo)
+    return lista_swr(
+        "clientes",
+        f"{page}:{page_size}:{activo}:{include_total}:{cursor}",
+        lambda sesion: ClienteService(sesion).listar_clientes(page, page_size, activo, include_total=include_total, cursor=cursor),
+        db,
+        background_tasks
+    )
 
 @router.put("/{cliente_id}", response_model=ClienteResponseDTO)
 def actualizar_cliente(
     cliente_id: int,
     cliente_data: ClienteUpdateDTO,
-    db: Session = Depends(get_db)
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Actualizar un cliente"""
-    cliente_service = ClienteService(db)
     return cliente_service.actualizar_cliente(cliente_id, cliente_data)
 
 @router.delete("/{cliente_id}")
 def desactivar_cliente(
     cliente_id: int,
-    db: Session = Depends(get_db)
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Desactivar un cliente"""
-    cliente_service = ClienteService(db)
     cliente_service.desactivar_cliente(cliente_id)
     return {"message": "Cliente desactivado exitosamente"}
 
-@router.get("/buscar/{term}", response_model=ClienteListResponseDTO)
+@router.get("/buscar/{term}", response_model=ClienteListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(100))])
 def buscar_clientes(
     term: str,
     page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    db: Session = Depends(get_db)
+    page_size: int = Query(100, ge=1, le=500, description="Tamaño de página (máximo 500)"),
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Buscar clientes por término"""
-    cliente_service = ClienteService(db)
     return cliente_service.buscar_clientes(term, page, page_size)
 
 @router.get("/{cliente_id}/validar-credito")
 def validar_limite_credito(
     cliente_id: int,
-    monto: float = Query(..., ge=0, description="Monto a validar"),
-    db: Session = Depends(get_db)
+    monto: Decimal = Query(..., ge=0, description="Monto a validar"),
+    cliente_service: ClienteService = Depends(get_cliente_service)
 ):
     """Validar límite de crédito de un cliente"""
-    cliente_service = ClienteService(db)
-    es_valido = cliente_service.validar_limite_credito(cliente_id, monto)
+    es_valido, _ = cliente_service.validar_limite_credito(cliente_id, monto)
     return {"cliente_id": cliente_id, "monto": monto, "credito_suficiente": es_valido}
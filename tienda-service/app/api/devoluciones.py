@@ -10,93 +10,107 @@
 # ============================================================================
 
 from typing import Optional, List
-from fastapi import APIRouter, Depends, Query, Header
+from fastapi import APIRouter, Depends, Query, Header, Request, BackgroundTasks
+import httpx
 from sqlalchemy.orm import Session
 
+from ..cache import lista_swr
 from ..database import get_db
+from ..dependencies import get_http_client, rate_limit_by_page_size
+from ..middleware.http_cache import etag_response
 from ..services.devolucion_service import DevolucionService
 from ..dtos.devolucion_dto import (
     DevolucionCreateDTO, DevolucionUpdateDTO,
-    DevolucionResponseDTO, DevolucionListResponseDTO
+    DevolucionResponseDTO, DevolucionListResponseDTO, EstadoDevolucion
 )
 
 router = APIRouter()
 
+def get_devolucion_service(
+    db: Session = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+) -> DevolucionService:
+    """Dependencia para obtener el servicio de devoluciones"""
+    return DevolucionService(db, http_client)
+
 @router.post("/", response_model=DevolucionResponseDTO, status_code=201)
 def crear_devolucion(
     devolucion_data: DevolucionCreateDTO,
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Crear una nueva devolución"""
-    devolucion_service = DevolucionService(db)
     return devolucion_service.crear_devolucion(devolucion_data)
 
 @router.get("/{devolucion_id}", response_model=DevolucionResponseDTO)
 def obtener_devolucion(
     devolucion_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Obtener una devolución por ID"""
-    devolucion_service = DevolucionService(db)
-    return devolucion_service.obtener_devolucion(devolucion_id)
+    return etag_response(request, devolucion_service.obtener_devolucion(devolucion_id))
 
 @router.get("/numero/{numero_devolucion}", response_model=DevolucionResponseDTO)
 def obtener_devolucion_por_numero(
     numero_devolucion: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Obtener una devolución por número"""
-    devolucion_service = DevolucionService(db)
-    return devolucion_service.obtener_devolucion_por_numero(numero_devolucion)
+    return etag_response(request, devolucion_service.obtener_devolucion_por_numero(numero_devolucion))
 
 @router.get("/pedido/{pedido_id}", response_model=List[DevolucionResponseDTO])
 def obtener_devoluciones_pedido(
     pedido_id: int,
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Obtener todas las devoluciones de un pedido"""
-    devolucion_service = DevolucionService(db)
     return devolucion_service.obtener_devoluciones_pedido(pedido_id)
 
-@router.get("/", response_model=DevolucionListResponseDTO)
+@router.get("/", response_model=DevolucionListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(50))])
 def listar_devoluciones(
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    page_size: int = Query(50, ge=1, le=200, description="Tamaño de página (máximo 200)"),
+    estado: Optional[EstadoDevolucion] = Query(None, description="Filtrar por estado"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
     db: Session = Depends(get_db)
 ):
     """Listar devoluciones con filtros y paginación"""
-    devolucion_service = DevolucionService(db)
-    return devolucion_service.listar_devoluciones(page, page_size, estado)
+    return lista_swr(
+        "devoluciones",
+        f"{page}:{page_size}:{estado}:{include_total}:{cursor}",
+        lambda sesion: DevolucionService(sesion).listar_devoluciones(page, page_size, estado, include_total=include_total, cursor=cursor),
+        db,
+        background_tasks
+    )
 
 @router.put("/{devolucion_id}", response_model=DevolucionResponseDTO)
 def actualizar_devolucion(
     devolucion_id: int,
     devolucion_data: DevolucionUpdateDTO,
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Actualizar una devolución"""
-    devolucion_service = DevolucionService(db)
     return devolucion_service.actualizar_devolucion(devolucion_id, devolucion_data)
 
 @router.post("/{devolucion_id}/inspeccionar", response_model=DevolucionResponseDTO)
 def inspeccionar_devolucion(
     devolucion_id: int,
     usuario: str = Header(..., alias="X-Usuario"),
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Marcar devolución como inspeccionada"""
-    devolucion_service = DevolucionService(db)
     return devolucion_service.inspeccionar_devolucion(devolucion_id, usuario)
 
 @router.post("/{devolucion_id}/aprobar", response_model=DevolucionResponseDTO)
 async def aprobar_devolucion(
     devolucion_id: int,
     usuario: str = Header(..., alias="X-Usuario"),
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Aprobar devolución y procesar reintegro de inventario"""
-    devolucion_service = DevolucionService(db)
     return await devolucion_service.aprobar_devolucion(devolucion_id, usuario)
 
 @router.post("/{devolucion_id}/rechazar", response_model=DevolucionResponseDTO)
@@ -104,29 +118,28 @@ def rechazar_devolucion(
     devolucion_id: int,
     motivo: str = Query(..., description="Motivo del rechazo"),
     usuario: str = Header(..., alias="X-Usuario"),
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Rechazar una devolución"""
-    devolucion_service = DevolucionService(db)
     return devolucion_service.rechazar_devolucion(devolucion_id, usuario, motivo)
 
 @router.post("/{devolucion_id}/procesar", response_model=DevolucionResponseDTO)
 async def procesar_devolucion(
     devolucion_id: int,
     usuario: str = Header(..., alias="X-Usuario"),
-    db: Session = Depends(get_db)
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Procesar completamente una devolución aprobada"""
-    devolucion_service = DevolucionService(db)
     return await devolucion_service.procesar_devolucion(devolucion_id, usuario)
 
-@router.get("/estado/{estado}", response_model=DevolucionListResponseDTO)
+@router.get("/estado/{estado}", response_model=DevolucionListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(50))])
 def obtener_devoluciones_por_estado(
-    estado: str,
+    estado: EstadoDevolucion,
     page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    db: Session = Depends(get_db)
+    page_size: int = Query(50, ge=1, le=200, description="Tamaño de página (máximo 200)"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    devolucion_service: DevolucionService = Depends(get_devolucion_service)
 ):
     """Obtener devoluciones por estado"""
-    devolucion_service = DevolucionService(db)
-    return devolucion_service.listar_devoluciones(page, page_size, estado)
+    return devolucion_service.listar_devoluciones(page, page_size, estado, include_total=include_total, cursor=cursor)
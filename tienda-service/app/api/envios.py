@@ -10,110 +10,120 @@
 # ============================================================================
 
 from typing import Optional, List
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request, BackgroundTasks
 from sqlalchemy.orm import Session
 
+from ..cache import lista_swr
 from ..database import get_db
+from ..dependencies import rate_limit_by_page_size
+from ..middleware.http_cache import etag_response
 from ..services.envio_service import EnvioService
 from ..dtos.envio_dto import (
     EnvioCreateDTO, EnvioUpdateDTO,
-    EnvioResponseDTO, EnvioListResponseDTO
+    EnvioResponseDTO, EnvioListResponseDTO, EstadoEnvio
 )
 
 router = APIRouter()
 
+def get_envio_service(db: Session = Depends(get_db)) -> EnvioService:
+    """Dependencia para obtener el servicio de envíos"""
+    return EnvioService(db)
+
 @router.post("/", response_model=EnvioResponseDTO, status_code=201)
 def crear_envio(
     envio_data: EnvioCreateDTO,
-    db: Session = Depends(get_db)
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Crear un nuevo envío"""
-    envio_service = EnvioService(db)
     return envio_service.crear_envio(envio_data)
 
 @router.get("/{envio_id}", response_model=EnvioResponseDTO)
 def obtener_envio(
     envio_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Obtener un envío por ID"""
-    envio_service = EnvioService(db)
-    return envio_service.obtener_envio(envio_id)
+    return etag_response(request, envio_service.obtener_envio(envio_id))
 
 @router.get("/numero/{numero_envio}", response_model=EnvioResponseDTO)
 def obtener_envio_por_numero(
     numero_envio: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Obtener un envío por número"""
-    envio_service = EnvioService(db)
-    return envio_service.obtener_envio_por_numero(numero_envio)
+    return etag_response(request, envio_service.obtener_envio_por_numero(numero_envio))
 
 @router.get("/pedido/{pedido_id}", response_model=List[EnvioResponseDTO])
 def obtener_envios_pedido(
     pedido_id: int,
-    db: Session = Depends(get_db)
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Obtener todos los envíos de un pedido"""
-    envio_service = EnvioService(db)
     return envio_service.obtener_envios_pedido(pedido_id)
 
-@router.get("/", response_model=EnvioListResponseDTO)
+@router.get("/", response_model=EnvioListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(100))])
 def listar_envios(
+    background_tasks: BackgroundTasks,
     page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    page_size: int = Query(100, ge=1, le=500, description="Tamaño de página (máximo 500)"),
+    estado: Optional[EstadoEnvio] = Query(None, description="Filtrar por estado"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
     db: Session = Depends(get_db)
 ):
     """Listar envíos con filtros y paginación"""
-    envio_service = EnvioService(db)
-    return envio_service.listar_envios(page, page_size, estado)
+    return lista_swr(
+        "envios",
+        f"{page}:{page_size}:{estado}:{include_total}:{cursor}",
+        lambda sesion: EnvioService(sesion).listar_envios(page, page_size, estado, include_total=include_total, cursor=cursor),
+        db,
+        background_tasks
+    )
 
 @router.put("/{envio_id}", response_model=EnvioResponseDTO)
 def actualizar_envio(
     envio_id: int,
     envio_data: EnvioUpdateDTO,
-    db: Session = Depends(get_db)
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Actualizar un envío"""
-    envio_service = EnvioService(db)
     return envio_service.actualizar_envio(envio_id, envio_data)
 
 @router.post("/{envio_id}/iniciar-transito", response_model=EnvioResponseDTO)
 def iniciar_transito(
     envio_id: int,
-    db: Session = Depends(get_db)
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Iniciar tránsito del envío"""
-    envio_service = EnvioService(db)
     return envio_service.iniciar_transito(envio_id)
 
 @router.post("/{envio_id}/marcar-entregado", response_model=EnvioResponseDTO)
 def marcar_entregado(
     envio_id: int,
-    db: Session = Depends(get_db)
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Marcar envío como entregado"""
-    envio_service = EnvioService(db)
     return envio_service.marcar_entregado(envio_id)
 
 @router.post("/{envio_id}/cancelar", response_model=EnvioResponseDTO)
 def cancelar_envio(
     envio_id: int,
     motivo: str = Query(..., description="Motivo de cancelación"),
-    db: Session = Depends(get_db)
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Cancelar un envío"""
-    envio_service = EnvioService(db)
     return envio_service.cancelar_envio(envio_id, motivo)
 
-@router.get("/estado/{estado}", response_model=EnvioListResponseDTO)
+@router.get("/estado/{estado}", response_model=EnvioListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(100))])
 def obtener_envios_por_estado(
-    estado: str,
+    estado: EstadoEnvio,
     page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    db: Session = Depends(get_db)
+    page_size: int = Query(100, ge=1, le=500, description="Tamaño de página (máximo 500)"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    envio_service: EnvioService = Depends(get_envio_service)
 ):
     """Obtener envíos por estado"""
-    envio_service = EnvioService(db)
-    return envio_service.listar_envios(page, page_size, estado)
+    return envio_service.listar_envios(page, page_size, estado, include_total=include_total, cursor=cursor)
@@ -10,108 +10,138 @@
 # ============================================================================
 
 from typing import Optional
-from fastapi import APIRouter, Depends, Query, Header
+from fastapi import APIRouter, Depends, Query, Header, Request, BackgroundTasks
+import httpx
 from sqlalchemy.orm import Session
 
+from ..cache import lista_swr
 from ..database import get_db
+from ..dependencies import get_http_client, rate_limit_by_page_size
+from ..middleware.http_cache import etag_response, respuesta_json
 from ..services.pedido_service import PedidoService
 from ..dtos.pedido_dto import (
     PedidoCreateDTO, PedidoUpdateDTO, PedidoConfirmarDTO,
-    PedidoResponseDTO, PedidoListResponseDTO
+    PedidoResponseDTO, PedidoListResponseDTO, PedidoCursoresResponseDTO, EstadoPedido
 )
 
 router = APIRouter()
 
+def get_pedido_service(
+    db: Session = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+) -> PedidoService:
+    """Dependencia para obtener el servicio de pedidos"""
+    return PedidoService(db, http_client)
+
 @router.post("/", response_model=PedidoResponseDTO, status_code=201)
 async def crear_pedido(
     pedido_data: PedidoCreateDTO,
     usuario_creacion: str = Header(..., alias="X-Usuario"),
-    db: Session = Depends(get_db)
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Crear un nuevo pedido con validaciones y reservas de stock"""
-    pedido_service = PedidoService(db)
-    return await pedido_service.crear_pedido(pedido_data, usuario_creacion)
+    return respuesta_json(await pedido_service.crear_pedido(pedido_data, usuario_creacion), status_code=201)
+
+@router.get("/cursores", response_model=PedidoCursoresResponseDTO)
+def obtener_cursores_pedidos(
+    page_size: int = Query(50, ge=1, le=200, description="Tamaño de página (máximo 200)"),
+    paginas: int = Query(4, ge=2, le=20, description="Número de páginas a preparar"),
+    cliente_id: Optional[int] = Query(None, description="Filtrar por cliente"),
+    estado: Optional[EstadoPedido] = Query(None, description="Filtrar por estado"),
+    cursor: Optional[str] = Query(None, description="Cursor desde el que empezar"),
+    pedido_service: PedidoService = Depends(get_pedido_service)
+):
+    """Obtener los cursores de varias páginas para descargarlas en paralelo"""
+    return pedido_service.obtener_cursores_pedidos(page_size, paginas, cliente_id, estado, cursor=cursor)
 
 @router.get("/{pedido_id}", response_model=PedidoResponseDTO)
 def obtener_pedido(
     pedido_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Obtener un pedido por ID"""
-    pedido_service = PedidoService(db)
-    return pedido_service.obtener_pedido(pedido_id)
+    return etag_response(request, pedido_service.obtener_pedido(pedido_id))
 
 @router.get("/numero/{numero_pedido}", response_model=PedidoResponseDTO)
 def obtener_pedido_por_numero(
     numero_pedido: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Obtener un pedido por número"""
-    pedido_service = PedidoService(db)
-    return pedido_service.obtener_pedido_por_numero(numero_pedido)
+    return etag_response(request, pedido_service.obtener_pedido_por_numero(numero_pedido))
 
-@router.get("/", response_model=PedidoListResponseDTO)
+@router.get("/", response_model=PedidoListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(50))])
 def listar_pedidos(
-    page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
+    background_tasks: BackgroundTasks,
+    page: int = Query(1, ge=1, deprecated=True, description="Número de página (usar cursor)"),
+    page_size: int = Query(50, ge=1, le=200, description="Tamaño de página (máximo 200)"),
     cliente_id: Optional[int] = Query(None, description="Filtrar por cliente"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado"),
+    estado: Optional[EstadoPedido] = Query(None, description="Filtrar por estado"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
     db: Session = Depends(get_db)
 ):
     """Listar pedidos con filtros y paginación"""
-    pedido_service = PedidoService(db)
-    return pedido_service.listar_pedidos(page, page_size, cliente_id, estado)
+    return lista_swr(
+        "pedidos",
+        f"{page}:{page_size}:{cliente_id}:{estado}:{include_total}:{cursor}",
+        lambda sesion: PedidoService(sesion).listar_pedidos(page, page_size, cliente_id, estado, include_total=include_total, cursor=cursor),
+        db,
+        background_tasks
+    )
 
 @router.put("/{pedido_id}", response_model=PedidoResponseDTO)
 def actualizar_pedido(
     pedido_id: int,
     pedido_data: PedidoUpdateDTO,
-    db: Session = Depends(get_db)
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Actualizar un pedido (solo en estados permitidos)"""
-    pedido_service = PedidoService(db)
-    return pedido_service.actualizar_pedido(pedido_id, pedido_data)
+    return respuesta_json(pedido_service.actualizar_pedido(pedido_id, pedido_data))
 
 @router.post("/{pedido_id}/confirmar", response_model=PedidoResponseDTO)
 async def confirmar_pedido(
     pedido_id: int,
     confirmacion_data: PedidoConfirmarDTO,
-    db: Session = Depends(get_db)
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Confirmar un pedido y ejecutar movimientos de stock"""
-    pedido_service = PedidoService(db)
-    return await pedido_service.confirmar_pedido(pedido_id, confirmacion_data)
+    return respuesta_json(await pedido_service.confirmar_pedido(pedido_id, confirmacion_data))
 
 @router.post("/{pedido_id}/cancelar", response_model=PedidoResponseDTO)
 def cancelar_pedido(
     pedido_id: int,
+    background_tasks: BackgroundTasks,
     motivo: str = Query(..., description="Motivo de cancelación"),
     usuario: str = Header(..., alias="X-Usuario"),
-    db: Session = Depends(get_db)
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Cancelar un pedido"""
-    pedido_service = PedidoService(db)
-    return pedido_service.cancelar_pedido(pedido_id, motivo, usuario)
+    return respuesta_json(pedido_service.cancelar_pedido(pedido_id, motivo, usuario, background_tasks))
 
-@router.get("/cliente/{cliente_id}", response_model=PedidoListResponseDTO)
+@router.get("/cliente/{cliente_id}", response_model=PedidoListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(50))])
 def obtener_pedidos_cliente(
     cliente_id: int,
-    page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    estado: Optional[str] = Query(None, description="Filtrar por estado"),
-    db: Session = Depends(get_db)
+    page: int = Query(1, ge=1, deprecated=True, description="Número de página (usar cursor)"),
+    page_size: int = Query(50, ge=1, le=200, description="Tamaño de página (máximo 200)"),
+    estado: Optional[EstadoPedido] = Query(None, description="Filtrar por estado"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Obtener pedidos de un cliente específico"""
-    pedido_service = PedidoService(db)
-    return pedido_service.listar_pedidos(page, page_size, cliente_id, estado)
+    return respuesta_json(pedido_service.listar_pedidos(page, page_size, cliente_id, estado, include_total=include_total, cursor=cursor))
 
-@router.get("/estado/{estado}", response_model=PedidoListResponseDTO)
+@router.get("/estado/{estado}", response_model=PedidoListResponseDTO, dependencies=[Depends(rate_limit_by_page_size(50))])
 def obtener_pedidos_por_estado(
-    estado: str,
-    page: int = Query(1, ge=1, description="Número de página"),
-    page_size: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
-    db: Session = Depends(get_db)
+    estado: EstadoPedido,
+    page: int = Query(1, ge=1, deprecated=True, description="Número de página (usar cursor)"),
+    page_size: int = Query(50, ge=1, le=200, description="Tamaño de página (máximo 200)"),
+    include_total: bool = Query(False, description="Incluir el total de registros"),
+    cursor: Optional[str] = Query(None, description="Cursor de la página siguiente"),
+    pedido_service: PedidoService = Depends(get_pedido_service)
 ):
     """Obtener pedidos por estado"""
-    pedido_service = PedidoService(db)
-    return pedido_service.listar_pedidos(page, page_size, None, estado)
+    return respuesta_json(pedido_service.listar_pedidos(page, page_size, None, estado, include_total=include_total, cursor=cursor))
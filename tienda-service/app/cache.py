@@ -0,0 +1,201 @@
+# ============================================================================
+# cache.py
+#
+# Caché compartida sobre Redis para lecturas frecuentes del servicio de
+# tienda. Las operaciones fallan en abierto: si Redis no está disponible
+# se registra la incidencia y la consulta continúa contra la base de datos.
+# Los listados usan stale-while-revalidate: una entrada vencida se sirve
+# mientras un único worker la regenera en segundo plano. Su clave incluye una
+# versión por recurso que se incrementa al confirmar cualquier escritura.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import orjson
+import logging
+import time
+from typing import Any, Callable, List, Optional
+
+import redis
+import redis.asyncio
+from fastapi import BackgroundTasks, Response
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+redis_client = redis.from_url(settings.redis_url)
+redis_async_client = redis.asyncio.from_url(settings.redis_url)
+
+# Tablas cuyas escrituras invalidan los listados de cada recurso
+_RECURSOS_LISTA = {
+    "clientes": "clientes",
+    "pedidos": "pedidos",
+    "pedido_detalles": "pedidos",
+    "envios": "envios",
+    "devoluciones": "devoluciones",
+    "devolucion_detalles": "devoluciones",
+}
+
+def cache_get(key: str) -> Optional[Any]:
+    """Obtener un valor JSON de la caché"""
+    try:
+        valor = redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al leer %s: %s", key, e)
+        return None
+    return orjson.loads(valor) if valor is not None else None
+
+def cache_get_many(keys: List[str]) -> List[Optional[Any]]:
+    """Obtener varios valores JSON de la caché en una sola llamada"""
+    if not keys:
+        return []
+    try:
+        valores = redis_client.mget(keys)
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al leer %s claves: %s", len(keys), e)
+        return [None] * len(keys)
+    return [orjson.loads(valor) if valor is not None else None for valor in valores]
+
+def cache_set(key: str, valor: Any, ttl: int) -> None:
+    """Guardar un valor JSON en la caché con expiración en segundos"""
+    try:
+        redis_client.setex(key, ttl, orjson.dumps(valor, default=str))
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al escribir %s: %s", key, e)
+
+def cache_delete(*keys: str) -> None:
+    """Invalidar una o varias claves de la caché"""
+    try:
+        redis_client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al invalidar %s: %s", keys, e)
+
+def credito_key(cliente_id: int) -> str:
+    """Clave de la proyección de crédito de un cliente"""
+    return f"credito:{cliente_id}"
+
+def producto_catalogo_key(producto_id: int) -> str:
+    """Clave de la ficha de un producto del catálogo"""
+    return f"cat:prod:{producto_id}"
+
+def _version_lista(recurso: str) -> int:
+    """Versión vigente de los listados de un recurso"""
+    try:
+        version = redis_client.get(f"lista:ver:{recurso}")
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al leer la versión de %s: %s", recurso, e)
+        return 0
+    return int(version) if version is not None else 0
+
+def invalidar_listas(*recursos: str) -> None:
+    """Dar por obsoletos los listados cacheados de los recursos indicados"""
+    try:
+        pipe = redis_client.pipeline()
+        for recurso in recursos:
+            pipe.incr(f"lista:ver:{recurso}")
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al invalidar listados %s: %s", recursos, e)
+
+def _marcar_listas(session: Session, tablas) -> None:
+    """Anotar en la sesión los recursos cuyos listados cambian al confirmar"""
+    recursos = {_RECURSOS_LISTA[tabla] for tabla in tablas if tabla in _RECURSOS_LISTA}
+    if recursos:
+        session.info.setdefault("listas_modificadas", set()).update(recursos)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _listas_tras_flush(session, flush_context):
+    objetos = (*session.new, *session.dirty, *session.deleted)
+    _marcar_listas(session, (obj.__table__.name for obj in objetos))
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _listas_tras_sentencia(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _marcar_listas(orm_execute_state.session, (mapper.local_table.name,))
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidar_tras_commit(session):
+    recursos = session.info.pop("listas_modificadas", None)
+    if recursos:
+        invalidar_listas(*recursos)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_tras_rollback(session):
+    session.info.pop("listas_modificadas", None)
+
+def _leer_lista(key: str) -> Optional[dict]:
+    """Leer una entrada de listado (payload serializado y marca de vencimiento)"""
+    try:
+        entrada = redis_client.hgetall(key)
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al leer %s: %s", key, e)
+        return None
+    if not entrada:
+        return None
+    return {"payload": entrada[b"payload"], "stale_at": float(entrada[b"stale_at"])}
+
+def _guardar_lista(key: str, payload: bytes) -> None:
+    """Guardar un listado conservándolo como respaldo más allá de su vencimiento"""
+    retencion = settings.lista_cache_ttl + settings.lista_cache_grace + settings.lista_cache_respaldo
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping={"payload": payload, "stale_at": time.time() + settings.lista_cache_ttl})
+        pipe.expire(key, retencion)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("Caché no disponible al escribir %s: %s", key, e)
+
+def _refrescar_lista(key: str, generar: Callable[[Session], BaseModel]) -> None:
+    """Regenerar un listado en segundo plano con una sesión propia"""
+    db = SessionLocal()
+    try:
+        _guardar_lista(key, generar(db).model_dump_json().encode())
+    except Exception:
+        logger.exception("Error al refrescar listado %s", key)
+    finally:
+        db.close()
+        cache_delete(f"{key}:refresco")
+
+def lista_swr(recurso: str, key: str, generar: Callable[[Session], BaseModel], db: Session,
+              background_tasks: BackgroundTasks) -> Response:
+    """Servir un listado desde caché aplicando stale-while-revalidate"""
+    key = f"lista:{recurso}:{_version_lista(recurso)}:{key}"
+    entrada = _leer_lista(key)
+    ahora = time.time()
+    
+    if entrada and ahora < entrada["stale_at"]:
+        return Response(content=entrada["payload"], media_type="application/json")
+    
+    if entrada and ahora < entrada["stale_at"] + settings.lista_cache_grace:
+        # Solo un worker por clave regenera la entrada vencida
+        try:
+            elegido = redis_client.set(f"{key}:refresco", 1, nx=True, ex=30)
+        except redis.RedisError:
+            elegido = False
+        if elegido:
+            background_tasks.add_task(_refrescar_lista, key, generar)
+        return Response(content=entrada["payload"], media_type="application/json")
+    
+    try:
+        payload = generar(db).model_dump_json().encode()
+    except SQLAlchemyError:
+        if entrada is None:
+            raise
+        logger.warning("Base de datos no disponible, sirviendo listado vencido %s", key)
+        return Response(
+            content=entrada["payload"],
+            media_type="application/json",
+            headers={"Warning": '110 - "Response is Stale"'}
+        )
+    
+    _guardar_lista(key, payload)
+    return Response(content=payload, media_type="application/json")
@@ -24,12 +24,30 @@ class Settings(BaseSettings):
     app_name: str = "NutriChain Tienda Service"
     app_version: str = "1.0.0"
     debug: bool = os.getenv("DEBUG", "False").lower() == "true"
+    auto_create_all: bool = os.getenv("AUTO_CREATE_ALL", "False").lower() == "true"
     
     allowed_origins: List[str] = ["*"]
     
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    credito_cache_ttl: int = 10
+    lista_cache_ttl: int = 5
+    lista_cache_grace: int = 30
+    lista_cache_respaldo: int = 300
+    catalogo_cache_ttl: int = 300
+    disponibilidad_cache_ttl: int = 3
+    
+    rate_limit_filas_por_minuto: int = 20000
+    
+    http_timeout: float = 30.0
+    http_connect_timeout: float = 5.0
+    http_max_connections: int = 200
+    http_max_keepalive: int = 100
+    http_keepalive_expiry: float = 30.0
+    circuito_umbral_fallos: int = 20
+    circuito_ventana: float = 30.0
+    circuito_apertura: float = 30.0
     
     almacen_service_url: str = os.getenv(
         "ALMACEN_SERVICE_URL", 
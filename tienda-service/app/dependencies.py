@@ -0,0 +1,59 @@
+# ============================================================================
+# dependencies.py
+#
+# Dependencias compartidas de FastAPI. Expone los recursos de larga vida
+# creados en el ciclo de vida de la aplicación, como el cliente HTTP
+# hacia los servicios de almacén y catálogo, y el limitador de consultas
+# de listado ponderado por tamaño de página.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import logging
+import time
+
+import httpx
+import redis
+from fastapi import HTTPException, Request
+
+from .cache import redis_client
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+VENTANA_RATE_LIMIT = 60
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependencia para obtener el cliente HTTP compartido"""
+    return request.app.state.http_client
+
+def rate_limit_by_page_size(page_size_default: int):
+    """Crear dependencia que limita las filas solicitadas por cliente y minuto"""
+    def dependencia(request: Request) -> None:
+        try:
+            peso = int(request.query_params.get("page_size", page_size_default))
+        except ValueError:
+            peso = page_size_default
+        
+        ventana = int(time.time()) // VENTANA_RATE_LIMIT
+        cliente = request.client.host if request.client else "desconocido"
+        key = f"rate_limit:{cliente}:{ventana}"
+        
+        try:
+            pipe = redis_client.pipeline()
+            pipe.incrby(key, max(peso, 1))
+            pipe.expire(key, VENTANA_RATE_LIMIT)
+            consumido, _ = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Limitador no disponible: %s", e)
+            return
+        
+        if consumido > settings.rate_limit_filas_por_minuto:
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas filas solicitadas, intente más tarde",
+                headers={"Retry-After": str(VENTANA_RATE_LIMIT - int(time.time()) % VENTANA_RATE_LIMIT)}
+            )
+    
+    return dependencia
@@ -9,37 +9,28 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import Optional, List
+from typing import Optional, List, Literal
 from decimal import Decimal
 from datetime import datetime
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+
+from .tipos import Dinero, Porcentaje
+
+TipoCliente = Literal["minorista", "mayorista", "corporativo", "distribuidor"]
 
 class ClienteBaseDTO(BaseModel):
     """DTO base para cliente"""
     codigo_cliente: str = Field(..., min_length=1, max_length=50, description="Código único del cliente")
     nombre: str = Field(..., min_length=1, max_length=255, description="Nombre del cliente")
-    email: Optional[str] = Field(None, max_length=255, description="Email del cliente")
+    email: Optional[EmailStr] = Field(None, max_length=255, description="Email del cliente")
     telefono: Optional[str] = Field(None, max_length=50, description="Teléfono del cliente")
     direccion: Optional[str] = Field(None, description="Dirección del cliente")
     ciudad: Optional[str] = Field(None, max_length=100, description="Ciudad del cliente")
     pais: str = Field("Colombia", max_length=50, description="País del cliente")
-    tipo_cliente: str = Field("minorista", max_length=50, description="Tipo de cliente")
-    limite_credito: Decimal = Field(0, ge=0, description="Límite de crédito")
-    descuento_porcentaje: Decimal = Field(0, ge=0, le=100, description="Porcentaje de descuento")
+    tipo_cliente: TipoCliente = Field("minorista", description="Tipo de cliente")
+    limite_credito: Dinero = Field(Decimal("0"), ge=0, description="Límite de crédito")
+    descuento_porcentaje: Porcentaje = Field(Decimal("0"), ge=0, le=100, description="Porcentaje de descuento")
     activo: bool = Field(True, description="Estado del cliente")
-    
-    @validator('email')
-    def validate_email(cls, v):
-        if v and '@' not in v:
-            raise ValueError('Email inválido')
-        return v
-    
-    @validator('tipo_cliente')
-    def validate_tipo_cliente(cls, v):
-        tipos_validos = ["minorista", "mayorista", "corporativo", "distribuidor"]
-        if v not in tipos_validos:
-            raise ValueError(f'Tipo debe ser uno de: {tipos_validos}')
-        return v
 
 class ClienteCreateDTO(ClienteBaseDTO):
     """DTO para crear un cliente"""
@@ -49,14 +40,14 @@ class ClienteUpdateDTO(BaseModel):
     """DTO para actualizar un cliente"""
     codigo_cliente: Optional[str] = Field(None, min_length=1, max_length=50)
     nombre: Optional[str] = Field(None, min_length=1, max_length=255)
-    email: Optional[str] = Field(None, max_length=255)
+    email: Optional[EmailStr] = Field(None, max_length=255)
     telefono: Optional[str] = Field(None, max_length=50)
     direccion: Optional[str] = None
     ciudad: Optional[str] = Field(None, max_length=100)
     pais: Optional[str] = Field(None, max_length=50)
-    tipo_cliente: Optional[str] = Field(None, max_length=50)
-    limite_credito: Optional[Decimal] = Field(None, ge=0)
-    descuento_porcentaje: Optional[Decimal] = Field(None, ge=0, le=100)
+    tipo_cliente: Optional[TipoCliente] = None
+    limite_credito: Optional[Dinero] = Field(None, ge=0)
+    descuento_porcentaje: Optional[Porcentaje] = Field(None, ge=0, le=100)
     activo: Optional[bool] = None
 
 class ClienteResponseDTO(BaseModel):
@@ -76,12 +67,18 @@ class ClienteResponseDTO(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+CAMPOS_CLIENTE_RESPUESTA = tuple(ClienteResponseDTO.model_fields)
+
+def cliente_response_desde_fila(fila) -> ClienteResponseDTO:
+    """Construir el DTO de respuesta sin validar a partir de una fila con las columnas de CAMPOS_CLIENTE_RESPUESTA"""
+    return ClienteResponseDTO.model_construct(**fila._mapping)
 
 class ClienteListResponseDTO(BaseModel):
     """DTO de respuesta para lista de clientes"""
     clientes: List[ClienteResponseDTO]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
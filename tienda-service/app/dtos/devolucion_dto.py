@@ -9,34 +9,25 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import Optional, List
+from typing import Optional, List, Literal
 from decimal import Decimal
 from datetime import datetime
-from pydantic import BaseModel, Field, validator
+from operator import attrgetter
+from pydantic import BaseModel, ConfigDict, Field
+
+from .tipos import Cantidad
+
+EstadoProducto = Literal["bueno", "dañado", "vencido", "defectuoso"]
+AccionDevolucion = Literal["reintegrar_inventario", "descarte", "reparacion", "devolver_proveedor"]
+EstadoDevolucion = Literal["recibida", "inspeccionada", "aprobada", "rechazada", "procesada"]
 
 class DevolucionDetalleCreateDTO(BaseModel):
     """DTO para crear detalle de devolución"""
     producto_id: int = Field(..., gt=0, description="ID del producto")
-    cantidad_devuelta: Decimal = Field(..., gt=0, description="Cantidad devuelta")
+    cantidad_devuelta: Cantidad = Field(..., gt=0, description="Cantidad devuelta")
     motivo_detalle: Optional[str] = Field(None, max_length=100, description="Motivo específico del detalle")
-    estado_producto: Optional[str] = Field(None, max_length=50, description="Estado del producto devuelto")
-    accion: Optional[str] = Field(None, max_length=50, description="Acción a realizar")
-    
-    @validator('estado_producto')
-    def validate_estado_producto(cls, v):
-        if v is not None:
-            estados_validos = ["bueno", "dañado", "vencido", "defectuoso"]
-            if v not in estados_validos:
-                raise ValueError(f'Estado del producto debe ser uno de: {estados_validos}')
-        return v
-    
-    @validator('accion')
-    def validate_accion(cls, v):
-        if v is not None:
-            acciones_validas = ["reintegrar_inventario", "descarte", "reparacion", "devolver_proveedor"]
-            if v not in acciones_validas:
-                raise ValueError(f'Acción debe ser una de: {acciones_validas}')
-        return v
+    estado_producto: Optional[EstadoProducto] = Field(None, description="Estado del producto devuelto")
+    accion: Optional[AccionDevolucion] = Field(None, description="Acción a realizar")
 
 class DevolucionCreateDTO(BaseModel):
     """DTO para crear una devolución"""
@@ -44,22 +35,14 @@ class DevolucionCreateDTO(BaseModel):
     envio_id: Optional[int] = Field(None, gt=0, description="ID del envío")
     motivo: str = Field(..., min_length=1, max_length=100, description="Motivo de la devolución")
     descripcion: Optional[str] = Field(None, description="Descripción detallada")
-    detalles: List[DevolucionDetalleCreateDTO] = Field(..., min_items=1, description="Detalles de la devolución")
+    detalles: List[DevolucionDetalleCreateDTO] = Field(..., min_length=1, description="Detalles de la devolución")
 
 class DevolucionUpdateDTO(BaseModel):
     """DTO para actualizar una devolución"""
     motivo: Optional[str] = Field(None, min_length=1, max_length=100)
     descripcion: Optional[str] = None
-    estado: Optional[str] = Field(None, max_length=50)
+    estado: Optional[EstadoDevolucion] = None
     usuario_procesamiento: Optional[str] = Field(None, max_length=255)
-    
-    @validator('estado')
-    def validate_estado(cls, v):
-        if v is not None:
-            estados_validos = ["recibida", "inspeccionada", "aprobada", "rechazada", "procesada"]
-            if v not in estados_validos:
-                raise ValueError(f'Estado debe ser uno de: {estados_validos}')
-        return v
 
 class DevolucionDetalleResponseDTO(BaseModel):
     """DTO de respuesta para detalle de devolución"""
@@ -70,8 +53,7 @@ class DevolucionDetalleResponseDTO(BaseModel):
     estado_producto: Optional[str]
     accion: Optional[str]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class DevolucionResponseDTO(BaseModel):
     """DTO de respuesta para devolución"""
@@ -85,14 +67,29 @@ class DevolucionResponseDTO(BaseModel):
     estado: str
     usuario_procesamiento: Optional[str]
     fecha_procesamiento: Optional[datetime]
+    updated_at: datetime
     detalles: List[DevolucionDetalleResponseDTO]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+_DEVOLUCION_CAMPOS = tuple(campo for campo in DevolucionResponseDTO.model_fields if campo != "detalles")
+_DEVOLUCION_GET = attrgetter(*_DEVOLUCION_CAMPOS)
+_DETALLE_CAMPOS = tuple(DevolucionDetalleResponseDTO.model_fields)
+_DETALLE_GET = attrgetter(*_DETALLE_CAMPOS)
+
+def devolucion_response_desde_orm(devolucion) -> DevolucionResponseDTO:
+    """Construir el DTO de respuesta sin validar a partir de una devolución leída de la base de datos"""
+    datos = dict(zip(_DEVOLUCION_CAMPOS, _DEVOLUCION_GET(devolucion)))
+    datos["detalles"] = [
+        DevolucionDetalleResponseDTO.model_construct(**dict(zip(_DETALLE_CAMPOS, _DETALLE_GET(detalle))))
+        for detalle in devolucion.detalles
+    ]
+    return DevolucionResponseDTO.model_construct(**datos)
 
 class DevolucionListResponseDTO(BaseModel):
     """DTO de respuesta para lista de devoluciones"""
     devoluciones: List[DevolucionResponseDTO]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
@@ -9,10 +9,15 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import Optional, List
+from typing import Optional, List, Literal
 from decimal import Decimal
 from datetime import datetime
-from pydantic import BaseModel, Field, validator
+from operator import attrgetter
+from pydantic import BaseModel, ConfigDict, Field
+
+from .tipos import Precio
+
+EstadoEnvio = Literal["programado", "en_transito", "entregado", "devuelto", "cancelado"]
 
 class EnvioCreateDTO(BaseModel):
     """DTO para crear un envío"""
@@ -23,7 +28,7 @@ class EnvioCreateDTO(BaseModel):
     telefono_conductor: Optional[str] = Field(None, max_length=50, description="Teléfono del conductor")
     fecha_programada: Optional[datetime] = Field(None, description="Fecha programada de envío")
     observaciones: Optional[str] = Field(None, description="Observaciones del envío")
-    costo_envio: Optional[Decimal] = Field(None, ge=0, description="Costo del envío")
+    costo_envio: Optional[Precio] = Field(None, ge=0, description="Costo del envío")
 
 class EnvioUpdateDTO(BaseModel):
     """DTO para actualizar un envío"""
@@ -34,17 +39,9 @@ class EnvioUpdateDTO(BaseModel):
     fecha_programada: Optional[datetime] = None
     fecha_salida: Optional[datetime] = None
     fecha_entrega: Optional[datetime] = None
-    estado: Optional[str] = Field(None, max_length=50)
+    estado: Optional[EstadoEnvio] = None
     observaciones: Optional[str] = None
-    costo_envio: Optional[Decimal] = Field(None, ge=0)
-    
-    @validator('estado')
-    def validate_estado(cls, v):
-        if v is not None:
-            estados_validos = ["programado", "en_transito", "entregado", "devuelto", "cancelado"]
-            if v not in estados_validos:
-                raise ValueError(f'Estado debe ser uno de: {estados_validos}')
-        return v
+    costo_envio: Optional[Precio] = Field(None, ge=0)
 
 class EnvioResponseDTO(BaseModel):
     """DTO de respuesta para envío"""
@@ -61,13 +58,21 @@ class EnvioResponseDTO(BaseModel):
     estado: str
     observaciones: Optional[str]
     costo_envio: Optional[Decimal]
+    updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore", revalidate_instances="never")
+
+_ENVIO_CAMPOS = tuple(EnvioResponseDTO.model_fields)
+_ENVIO_GET = attrgetter(*_ENVIO_CAMPOS)
+
+def envio_response_desde_orm(envio) -> EnvioResponseDTO:
+    """Construir el DTO de respuesta sin validar a partir de un envío leído de la base de datos"""
+    return EnvioResponseDTO.model_construct(**dict(zip(_ENVIO_CAMPOS, _ENVIO_GET(envio))))
 
 class EnvioListResponseDTO(BaseModel):
     """DTO de respuesta para lista de envíos"""
     envios: List[EnvioResponseDTO]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
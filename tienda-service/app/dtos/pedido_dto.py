@@ -9,17 +9,26 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import Optional, List
+from typing import Optional, List, Literal
 from decimal import Decimal
 from datetime import datetime, date
-from pydantic import BaseModel, Field, validator
+from operator import attrgetter
+from pydantic import BaseModel, ConfigDict, Field
+
+from .tipos import Cantidad, Precio
+
+Prioridad = Literal["baja", "normal", "alta", "urgente"]
+EstadoPedido = Literal[
+    "borrador", "pendiente", "confirmado", "preparando",
+    "enviado", "entregado", "cancelado", "fallido"
+]
 
 class PedidoDetalleCreateDTO(BaseModel):
     """DTO para crear detalle de pedido"""
     producto_id: int = Field(..., gt=0, description="ID del producto")
-    cantidad: Decimal = Field(..., gt=0, description="Cantidad del producto")
-    precio_unitario: Decimal = Field(..., gt=0, description="Precio unitario")
-    descuento_linea: Decimal = Field(0, ge=0, description="Descuento por línea")
+    cantidad: Cantidad = Field(..., gt=0, description="Cantidad del producto")
+    precio_unitario: Precio = Field(..., gt=0, description="Precio unitario")
+    descuento_linea: Precio = Field(Decimal("0"), ge=0, description="Descuento por línea")
     almacen_origen_id: Optional[int] = Field(None, gt=0, description="ID del almacén origen")
 
 class PedidoCreateDTO(BaseModel):
@@ -31,25 +40,18 @@ class PedidoCreateDTO(BaseModel):
     almacen_origen_id: Optional[int] = Field(None, gt=0, description="ID del almacén origen")
     direccion_entrega: Optional[str] = Field(None, description="Dirección de entrega")
     observaciones: Optional[str] = Field(None, description="Observaciones del pedido")
-    prioridad: str = Field("normal", max_length=20, description="Prioridad del pedido")
-    detalles: List[PedidoDetalleCreateDTO] = Field(..., min_items=1, description="Detalles del pedido")
-    
-    @validator('prioridad')
-    def validate_prioridad(cls, v):
-        prioridades_validas = ["baja", "normal", "alta", "urgente"]
-        if v not in prioridades_validas:
-            raise ValueError(f'Prioridad debe ser una de: {prioridades_validas}')
-        return v
+    prioridad: Prioridad = Field("normal", description="Prioridad del pedido")
+    detalles: List[PedidoDetalleCreateDTO] = Field(..., min_length=1, description="Detalles del pedido")
 
 class PedidoUpdateDTO(BaseModel):
     """DTO para actualizar un pedido"""
     fecha_requerida: Optional[date] = None
     fecha_prometida: Optional[date] = None
-    estado: Optional[str] = Field(None, max_length=50)
+    estado: Optional[EstadoPedido] = None
     metodo_pago: Optional[str] = Field(None, max_length=50)
     direccion_entrega: Optional[str] = None
     observaciones: Optional[str] = None
-    prioridad: Optional[str] = Field(None, max_length=20)
+    prioridad: Optional[Prioridad] = None
     usuario_aprobacion: Optional[str] = Field(None, max_length=255)
     motivo_cancelacion: Optional[str] = None
 
@@ -67,8 +69,7 @@ class PedidoDetalleResponseDTO(BaseModel):
     descuento_linea: Decimal
     subtotal_linea: Decimal
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore", revalidate_instances="never")
 
 class PedidoResponseDTO(BaseModel):
     """DTO de respuesta para pedido"""
@@ -93,21 +94,47 @@ class PedidoResponseDTO(BaseModel):
     usuario_aprobacion: Optional[str]
     fecha_aprobacion: Optional[datetime]
     motivo_cancelacion: Optional[str]
+    updated_at: datetime
     detalles: List[PedidoDetalleResponseDTO]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, extra="ignore", revalidate_instances="never")
+
+_PEDIDO_CAMPOS = tuple(campo for campo in PedidoResponseDTO.model_fields if campo != "detalles")
+_PEDIDO_GET = attrgetter(*_PEDIDO_CAMPOS)
+_DETALLE_CAMPOS = tuple(PedidoDetalleResponseDTO.model_fields)
+_DETALLE_GET = attrgetter(*_DETALLE_CAMPOS)
+
+def pedido_response_desde_orm(pedido) -> PedidoResponseDTO:
+    """Construir el DTO de respuesta sin validar a partir de un pedido leído de la base de datos"""
+    datos = dict(zip(_PEDIDO_CAMPOS, _PEDIDO_GET(pedido)))
+    datos["detalles"] = [
+        PedidoDetalleResponseDTO.model_construct(**dict(zip(_DETALLE_CAMPOS, _DETALLE_GET(detalle))))
+        for detalle in pedido.detalles
+    ]
+    return PedidoResponseDTO.model_construct(**datos)
 
 class PedidoListResponseDTO(BaseModel):
     """DTO de respuesta para lista de pedidos"""
     pedidos: List[PedidoResponseDTO]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
+    next_cursor: Optional[str] = None
+
+class PedidoCursoresResponseDTO(BaseModel):
+    """DTO de respuesta con los cursores de páginas consecutivas de pedidos"""
+    cursores: List[Optional[str]]
+    page_size: int
+
+class DisponibilidadItemDTO(BaseModel):
+    """DTO de producto a consultar en el almacén"""
+    producto_id: int = Field(..., gt=0, description="ID del producto")
+    cantidad: Cantidad = Field(..., gt=0, description="Cantidad requerida")
+    almacen_id: Optional[int] = Field(None, gt=0, description="ID del almacén")
 
 class ConsultarDisponibilidadDTO(BaseModel):
     """DTO para consultar disponibilidad de productos"""
-    productos: List[dict] = Field(..., description="Lista de productos con producto_id, cantidad y almacen_id")
+    productos: List[DisponibilidadItemDTO] = Field(..., min_length=1, description="Productos a consultar")
 
 class ReservaStockDTO(BaseModel):
     """DTO para reserva de stock"""
@@ -0,0 +1,20 @@
+# ============================================================================
+# tipos.py
+#
+# Tipos numéricos compartidos por los DTOs. Restringen los importes y
+# cantidades a la precisión de las columnas Numeric donde se almacenan,
+# de modo que los valores fuera de rango se rechacen en la validación.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+from decimal import Decimal
+from typing import Annotated
+
+from pydantic import Field
+
+Dinero = Annotated[Decimal, Field(max_digits=12, decimal_places=2)]
+Precio = Annotated[Decimal, Field(max_digits=10, decimal_places=2)]
+Cantidad = Annotated[Decimal, Field(max_digits=10, decimal_places=2)]
+Porcentaje = Annotated[Decimal, Field(max_digits=5, decimal_places=2)]
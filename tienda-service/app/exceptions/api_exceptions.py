@@ -9,10 +9,12 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import Optional, Any
+from typing import Any, ClassVar, Optional
 
 class TiendaException(Exception):
     """Excepción base para el servicio de tienda"""
+    status_code: ClassVar[int] = 400
+    
     def __init__(self, message: str, error_code: Optional[str] = None, details: Optional[Any] = None):
         self.message = message
         self.error_code = error_code
@@ -21,6 +23,8 @@ class TiendaException(Exception):
 
 class ClienteNotFoundError(TiendaException):
     """Error cuando no se encuentra un cliente"""
+    status_code: ClassVar[int] = 404
+    
     def __init__(self, cliente_id: int):
         super().__init__(
             f"Cliente con ID {cliente_id} no encontrado",
@@ -30,6 +34,8 @@ class ClienteNotFoundError(TiendaException):
 
 class ClienteInactivoError(TiendaException):
     """Error cuando un cliente está inactivo"""
+    status_code: ClassVar[int] = 409
+    
     def __init__(self, cliente_id: int):
         super().__init__(
             f"Cliente con ID {cliente_id} está inactivo",
@@ -39,6 +45,8 @@ class ClienteInactivoError(TiendaException):
 
 class PedidoNotFoundError(TiendaException):
     """Error cuando no se encuentra un pedido"""
+    status_code: ClassVar[int] = 404
+    
     def __init__(self, pedido_id: int):
         super().__init__(
             f"Pedido con ID {pedido_id} no encontrado",
@@ -48,6 +56,8 @@ class PedidoNotFoundError(TiendaException):
 
 class PedidoEstadoInvalidoError(TiendaException):
     """Error cuando el estado del pedido no permite la operación"""
+    status_code: ClassVar[int] = 409
+    
     def __init__(self, pedido_id: int, estado_actual: str, estado_requerido: str):
         super().__init__(
             f"Pedido {pedido_id} está en estado '{estado_actual}', se requiere '{estado_requerido}'",
@@ -57,6 +67,8 @@ class PedidoEstadoInvalidoError(TiendaException):
 
 class StockInsuficienteError(TiendaException):
     """Error cuando no hay stock suficiente"""
+    status_code: ClassVar[int] = 409
+    
     def __init__(self, producto_id: int, cantidad_solicitada: float, cantidad_disponible: float):
         super().__init__(
             f"Stock insuficiente para producto {producto_id}. Solicitado: {cantidad_solicitada}, Disponible: {cantidad_disponible}",
@@ -66,6 +78,8 @@ class StockInsuficienteError(TiendaException):
 
 class LimiteCreditoExcedidoError(TiendaException):
     """Error cuando se excede el límite de crédito del cliente"""
+    status_code: ClassVar[int] = 409
+    
     def __init__(self, cliente_id: int, limite_credito: float, total_pedido: float):
         super().__init__(
             f"Límite de crédito excedido para cliente {cliente_id}. Límite: {limite_credito}, Total pedido: {total_pedido}",
@@ -75,6 +89,8 @@ class LimiteCreditoExcedidoError(TiendaException):
 
 class EnvioNotFoundError(TiendaException):
     """Error cuando no se encuentra un envío"""
+    status_code: ClassVar[int] = 404
+    
     def __init__(self, envio_id: int):
         super().__init__(
             f"Envío con ID {envio_id} no encontrado",
@@ -84,6 +100,8 @@ class EnvioNotFoundError(TiendaException):
 
 class DevolucionNotFoundError(TiendaException):
     """Error cuando no se encuentra una devolución"""
+    status_code: ClassVar[int] = 404
+    
     def __init__(self, devolucion_id: int):
         super().__init__(
             f"Devolución con ID {devolucion_id} no encontrada",
@@ -93,6 +111,8 @@ class DevolucionNotFoundError(TiendaException):
 
 class ServicioExternoError(TiendaException):
     """Error de comunicación con servicios externos"""
+    status_code: ClassVar[int] = 502
+    
     def __init__(self, servicio: str, error_message: str):
         super().__init__(
             f"Error en servicio {servicio}: {error_message}",
@@ -100,8 +120,17 @@ class ServicioExternoError(TiendaException):
             {"servicio": servicio, "error_message": error_message}
         )
 
+class ServicioNoDisponibleError(ServicioExternoError):
+    """Error cuando el circuito de un servicio externo está abierto tras fallos repetidos"""
+    status_code: ClassVar[int] = 503
+    
+    def __init__(self, servicio: str):
+        super().__init__(servicio, "Servicio temporalmente no disponible")
+        self.error_code = "SERVICIO_NO_DISPONIBLE"
+
 class ValidationError(TiendaException):
     """Error de validación de datos"""
+    
     def __init__(self, field: str, value: Any, message: str):
         super().__init__(
             f"Error de validación en campo '{field}': {message}",
@@ -111,6 +140,8 @@ class ValidationError(TiendaException):
 
 class CodigoClienteExisteError(TiendaException):
     """Error cuando el código de cliente ya existe"""
+    status_code: ClassVar[int] = 409
+    
     def __init__(self, codigo_cliente: str):
         super().__init__(
             f"Ya existe un cliente con código '{codigo_cliente}'",
@@ -120,6 +151,8 @@ class CodigoClienteExisteError(TiendaException):
 
 class NumeroPedidoExisteError(TiendaException):
     """Error cuando el número de pedido ya existe"""
+    status_code: ClassVar[int] = 409
+    
     def __init__(self, numero_pedido: str):
         super().__init__(
             f"Ya existe un pedido con número '{numero_pedido}'",
@@ -10,25 +10,48 @@
 # ============================================================================
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import IntegrityError
 import logging
-from typing import Union
+import re
+import orjson
+from typing import Any, Union
 
 from ..exceptions.api_exceptions import TiendaException
 
 logger = logging.getLogger(__name__)
 
+_INTEGRIDAD_RE = re.compile(r"unique constraint|foreign key constraint", re.IGNORECASE)
+_MENSAJES_INTEGRIDAD = {
+    "unique constraint": "Ya existe un registro con estos datos únicos",
+    "foreign key constraint": "Referencia a datos que no existen",
+}
+
+# Cuerpos de error con forma fija: solo se serializa la parte variable
+_HTTP_ERROR_TMPL = b'{"error":true,"message":%s,"error_code":"HTTP_ERROR"}'
+_INTERNAL_ERROR_BODY = orjson.dumps({
+    "error": True,
+    "message": "Error interno del servidor",
+    "error_code": "INTERNAL_SERVER_ERROR"
+})
+
+class FastJSONResponse(Response):
+    """Respuesta JSON serializada con orjson; los tipos no nativos (Decimal, excepciones) se convierten a texto"""
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+
 def setup_exception_handlers(app: FastAPI):
     """Configura los manejadores de excepciones globales"""
     
     @app.exception_handler(TiendaException)
     async def tienda_exception_handler(request: Request, exc: TiendaException):
         """Manejador para excepciones específicas del servicio de tienda"""
-        logger.error(f"TiendaException: {exc.message}", extra={"details": exc.details})
-        return JSONResponse(
-            status_code=400,
+        logger.error("TiendaException: %s", exc.message, extra={"details": exc.details})
+        return FastJSONResponse(
+            status_code=exc.status_code,
             content={
                 "error": True,
                 "message": exc.message,
@@ -40,42 +63,42 @@ def setup_exception_handlers(app: FastAPI):
     @app.exception_handler(HTTPException)
     async def http_exception_handler(request: Request, exc: HTTPException):
         """Manejador para excepciones HTTP estándar"""
-        logger.error(f"HTTPException: {exc.detail}")
-        return JSONResponse(
+        logger.error("HTTPException: %s", exc.detail)
+        return Response(
+            content=_HTTP_ERROR_TMPL % orjson.dumps(exc.detail, default=str),
             status_code=exc.status_code,
-            content={
-                "error": True,
-                "message": exc.detail,
-                "error_code": "HTTP_ERROR"
-            }
+            media_type="application/json",
+            headers=getattr(exc, "headers", None)
         )
     
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError):
         """Manejador para errores de validación de Pydantic"""
-        logger.error(f"ValidationError: {exc.errors()}")
-        return JSONResponse(
+        errores = exc.errors()
+        logger.error("ValidationError: %s", errores)
+        return FastJSONResponse(
             status_code=422,
             content={
                 "error": True,
                 "message": "Error de validación en los datos enviados",
                 "error_code": "VALIDATION_ERROR",
-                "details": exc.errors()
+                "details": errores
             }
         )
     
     @app.exception_handler(IntegrityError)
     async def integrity_error_handler(request: Request, exc: IntegrityError):
         """Manejador para errores de integridad de base de datos"""
-        logger.error(f"IntegrityError: {str(exc.orig)}")
+        detalle = str(exc.orig)
+        logger.error("IntegrityError: %s", detalle)
         
-        error_message = "Error de integridad en la base de datos"
-        if "unique constraint" in str(exc.orig).lower():
-            error_message = "Ya existe un registro con estos datos únicos"
-        elif "foreign key constraint" in str(exc.orig).lower():
-            error_message = "Referencia a datos que no existen"
+        coincidencia = _INTEGRIDAD_RE.search(detalle)
+        error_message = (
+            _MENSAJES_INTEGRIDAD[coincidencia.group().lower()]
+            if coincidencia else "Error de integridad en la base de datos"
+        )
         
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=400,
             content={
                 "error": True,
@@ -87,12 +110,5 @@ def setup_exception_handlers(app: FastAPI):
     @app.exception_handler(Exception)
     async def general_exception_handler(request: Request, exc: Exception):
         """Manejador para excepciones generales no controladas"""
-        logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": True,
-                "message": "Error interno del servidor",
-                "error_code": "INTERNAL_SERVER_ERROR"
-            }
-        )
+        logger.error("Unhandled exception: %s", exc, exc_info=True)
+        return Response(content=_INTERNAL_ERROR_BODY, status_code=500, media_type="application/json")
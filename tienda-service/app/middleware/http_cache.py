@@ -0,0 +1,53 @@
+# ============================================================================
+# http_cache.py
+#
+# Utilidades de caché HTTP para los endpoints de consulta. Calcula ETags a
+# partir de los DTOs de respuesta y permite responder 304 Not Modified
+# cuando el cliente ya dispone de la representación vigente del recurso.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+CACHE_CONTROL = "private, max-age=30"
+
+def calcular_etag(obj: BaseModel, payload: Optional[bytes] = None) -> str:
+    """Calcular ETag débil para un DTO de respuesta"""
+    updated_at = getattr(obj, "updated_at", None)
+    if updated_at is not None:
+        return f'W/"{obj.id}-{int(updated_at.timestamp() * 1000000)}"'
+
+    # Sin marca de actualización se usa un resumen del contenido serializado
+    digest = hashlib.blake2b(payload or obj.model_dump_json().encode(), digest_size=8).hexdigest()
+    return f'W/"{obj.id}-{digest}"'
+
+def _etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Verificar si el encabezado If-None-Match contiene el ETag vigente"""
+    if not if_none_match:
+        return False
+    candidatos = [valor.strip() for valor in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+def respuesta_json(obj: BaseModel, status_code: int = 200) -> Response:
+    """Serializar el DTO con Pydantic y entregarlo tal cual, sin revalidarlo ni recodificarlo en FastAPI"""
+    return Response(content=obj.model_dump_json(), status_code=status_code, media_type="application/json")
+
+def etag_response(request: Request, obj: BaseModel) -> Response:
+    """Adjuntar ETag y Cache-Control, o responder 304 si el cliente tiene la versión vigente"""
+    # Con updated_at el ETag no necesita el contenido; solo se serializa si hace falta el resumen
+    payload = None if getattr(obj, "updated_at", None) is not None else obj.model_dump_json().encode()
+    etag = calcular_etag(obj, payload)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if _etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if payload is None:
+        payload = obj.model_dump_json().encode()
+    return Response(content=payload, media_type="application/json", headers=headers)
@@ -13,6 +13,7 @@ from .pedido import Pedido, PedidoDetalle
 from .envio import Envio
 from .devolucion import Devolucion, DevolucionDetalle
 from .reserva_stock import ReservaStock
+from .secuencias import PEDIDO_NUMERO_SEQ, ENVIO_NUMERO_SEQ, DEVOLUCION_NUMERO_SEQ
 
 __all__ = [
     "Cliente",
@@ -21,5 +22,8 @@ __all__ = [
     "Envio",
     "Devolucion",
     "DevolucionDetalle",
-    "ReservaStock"
+    "ReservaStock",
+    "PEDIDO_NUMERO_SEQ",
+    "ENVIO_NUMERO_SEQ",
+    "DEVOLUCION_NUMERO_SEQ"
 ]
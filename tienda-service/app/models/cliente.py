@@ -9,7 +9,8 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Numeric, func, Text
+from decimal import Decimal
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Numeric, func, Text, Enum, Index, DDL, event
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -17,6 +18,10 @@ class Cliente(Base):
     """Modelo para la tabla clientes"""
     
     __tablename__ = "clientes"
+    __table_args__ = (
+        Index("ix_clientes_created_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     codigo_cliente = Column(String(50), nullable=False, unique=True, index=True)
@@ -26,9 +31,12 @@ class Cliente(Base):
     direccion = Column(Text, nullable=True)
     ciudad = Column(String(100), nullable=True)
     pais = Column(String(50), nullable=True, default="Colombia")
-    tipo_cliente = Column(String(50), nullable=True, default="minorista")
-    limite_credito = Column(Numeric(12, 2), nullable=True, default=0)
-    descuento_porcentaje = Column(Numeric(5, 2), nullable=True, default=0)
+    tipo_cliente = Column(
+        Enum("minorista", "mayorista", "corporativo", "distribuidor", name="tipo_cliente_enum"),
+        nullable=True, default="minorista"
+    )
+    limite_credito = Column(Numeric(12, 2), nullable=True, default=Decimal("0.00"))
+    descuento_porcentaje = Column(Numeric(5, 2), nullable=True, default=Decimal("0.00"))
     activo = Column(Boolean, default=True, index=True)
     created_at = Column(DateTime, server_default=func.current_timestamp())
     updated_at = Column(DateTime, server_default=func.current_timestamp())
@@ -37,3 +45,21 @@ class Cliente(Base):
     
     def __repr__(self):
         return f"<Cliente(id={self.id}, codigo='{self.codigo_cliente}', nombre='{self.nombre}')>"
+
+# Texto combinado sobre el que busca ClienteRepository.search
+TEXTO_BUSQUEDA_CLIENTE = (
+    Cliente.nombre + " " + Cliente.codigo_cliente + " " + func.coalesce(Cliente.email, "")
+)
+
+Index(
+    "ix_clientes_busqueda_trgm",
+    TEXTO_BUSQUEDA_CLIENTE.label("texto_busqueda"),
+    postgresql_using="gin",
+    postgresql_ops={"texto_busqueda": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
@@ -9,7 +9,7 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, func, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, func, Text, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -17,6 +17,10 @@ class Devolucion(Base):
     """Modelo para la tabla devoluciones"""
     
     __tablename__ = "devoluciones"
+    __table_args__ = (
+        Index("ix_devoluciones_fecha_id", "fecha_devolucion", "id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     numero_devolucion = Column(String(50), nullable=False, unique=True)
@@ -25,9 +29,13 @@ class Devolucion(Base):
     fecha_devolucion = Column(DateTime, server_default=func.current_timestamp())
     motivo = Column(String(100), nullable=False)
     descripcion = Column(Text, nullable=True)
-    estado = Column(String(50), nullable=True, default="recibida")
+    estado = Column(
+        Enum("recibida", "inspeccionada", "aprobada", "rechazada", "procesada", name="estado_devolucion_enum"),
+        nullable=True, default="recibida"
+    )
     usuario_procesamiento = Column(String(255), nullable=True)
     fecha_procesamiento = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
     
     pedido = relationship("Pedido", back_populates="devoluciones")
     envio = relationship("Envio", back_populates="devoluciones")
@@ -46,8 +54,11 @@ class DevolucionDetalle(Base):
     producto_id = Column(Integer, nullable=False)
     cantidad_devuelta = Column(Numeric(10, 2), nullable=False)
     motivo_detalle = Column(String(100), nullable=True)
-    estado_producto = Column(String(50), nullable=True)
-    accion = Column(String(50), nullable=True)
+    estado_producto = Column(Enum("bueno", "dañado", "vencido", "defectuoso", name="estado_producto_enum"), nullable=True)
+    accion = Column(
+        Enum("reintegrar_inventario", "descarte", "reparacion", "devolver_proveedor", name="accion_devolucion_enum"),
+        nullable=True
+    )
     
     devolucion = relationship("Devolucion", back_populates="detalles")
     
@@ -9,7 +9,7 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, func, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Numeric, func, Text, ForeignKey, Index, Enum
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -17,10 +17,14 @@ class Envio(Base):
     """Modelo para la tabla envios"""
     
     __tablename__ = "envios"
+    __table_args__ = (
+        Index("ix_envios_pedido_estado", "pedido_id", "estado"),
+        Index("ix_envios_fecha_id", "fecha_programada", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     numero_envio = Column(String(50), nullable=False, unique=True, index=True)
-    pedido_id = Column(Integer, ForeignKey("pedidos.id"), nullable=False, index=True)
+    pedido_id = Column(Integer, ForeignKey("pedidos.id"), nullable=False)
     transportista = Column(String(255), nullable=True)
     vehiculo = Column(String(100), nullable=True)
     conductor = Column(String(255), nullable=True)
@@ -28,9 +32,13 @@ class Envio(Base):
     fecha_programada = Column(DateTime, nullable=True)
     fecha_salida = Column(DateTime, nullable=True)
     fecha_entrega = Column(DateTime, nullable=True)
-    estado = Column(String(50), nullable=True, default="programado", index=True)
+    estado = Column(
+        Enum("programado", "en_transito", "entregado", "devuelto", "cancelado", name="estado_envio_enum"),
+        nullable=True, default="programado"
+    )
     observaciones = Column(Text, nullable=True)
     costo_envio = Column(Numeric(10, 2), nullable=True)
+    updated_at = Column(DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
     
     pedido = relationship("Pedido", back_populates="envios")
     devoluciones = relationship("Devolucion", back_populates="envio")
@@ -9,7 +9,8 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Numeric, func, Text, Date, ForeignKey
+from decimal import Decimal
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Numeric, func, Text, Date, ForeignKey, Index, Enum
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -17,28 +18,42 @@ class Pedido(Base):
     """Modelo para la tabla pedidos"""
     
     __tablename__ = "pedidos"
+    __table_args__ = (
+        Index("ix_pedidos_cliente_estado", "cliente_id", "estado"),
+        # Con el filtro fijado, el índice entrega las filas ya en el orden del cursor
+        Index("ix_pedidos_estado_fecha_id", "estado", "fecha_pedido", "id"),
+        Index("ix_pedidos_cliente_fecha_id", "cliente_id", "fecha_pedido", "id"),
+        Index("ix_pedidos_fecha_id", "fecha_pedido", "id"),
+    )
+    # Recuperar los valores por defecto del servidor en el mismo INSERT
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     numero_pedido = Column(String(50), nullable=False, unique=True, index=True)
-    cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=False, index=True)
+    cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=False)
     fecha_pedido = Column(DateTime, server_default=func.current_timestamp())
     fecha_requerida = Column(Date, nullable=True)
     fecha_prometida = Column(Date, nullable=True)
     fecha_entrega = Column(DateTime, nullable=True)
-    estado = Column(String(50), nullable=False, default="borrador", index=True)
-    subtotal = Column(Numeric(12, 2), nullable=True, default=0)
-    descuento = Column(Numeric(12, 2), nullable=True, default=0)
-    impuestos = Column(Numeric(12, 2), nullable=True, default=0)
-    total = Column(Numeric(12, 2), nullable=True, default=0)
+    estado = Column(
+        Enum("borrador", "pendiente", "confirmado", "preparando", "enviado", "entregado",
+             "cancelado", "fallido", name="estado_pedido_enum"),
+        nullable=False, default="borrador"
+    )
+    subtotal = Column(Numeric(12, 2), nullable=True, default=Decimal("0.00"))
+    descuento = Column(Numeric(12, 2), nullable=True, default=Decimal("0.00"))
+    impuestos = Column(Numeric(12, 2), nullable=True, default=Decimal("0.00"))
+    total = Column(Numeric(12, 2), nullable=True, default=Decimal("0.00"))
     metodo_pago = Column(String(50), nullable=True)
     almacen_origen_id = Column(Integer, nullable=True)
     direccion_entrega = Column(Text, nullable=True)
     observaciones = Column(Text, nullable=True)
-    prioridad = Column(String(20), nullable=True, default="normal", index=True)
+    prioridad = Column(Enum("baja", "normal", "alta", "urgente", name="prioridad_pedido_enum"), nullable=True, default="normal", index=True)
     usuario_creacion = Column(String(255), nullable=True)
     usuario_aprobacion = Column(String(255), nullable=True)
     fecha_aprobacion = Column(DateTime, nullable=True)
     motivo_cancelacion = Column(Text, nullable=True)
+    updated_at = Column(DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
     
     cliente = relationship("Cliente", back_populates="pedidos")
     detalles = relationship("PedidoDetalle", back_populates="pedido", cascade="all, delete-orphan")
@@ -59,7 +74,7 @@ class PedidoDetalle(Base):
     producto_id = Column(Integer, nullable=False)
     cantidad = Column(Numeric(10, 2), nullable=False)
     precio_unitario = Column(Numeric(10, 2), nullable=False)
-    descuento_linea = Column(Numeric(10, 2), nullable=True, default=0)
+    descuento_linea = Column(Numeric(10, 2), nullable=True, default=Decimal("0.00"))
     subtotal_linea = Column(Numeric(12, 2), nullable=False)
     
     pedido = relationship("Pedido", back_populates="detalles")
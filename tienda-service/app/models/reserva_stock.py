@@ -9,7 +9,7 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from sqlalchemy import Column, Integer, DateTime, Numeric, func, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, DateTime, Numeric, func, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -17,6 +17,10 @@ class ReservaStock(Base):
     """Modelo para la tabla reservas_stock"""
     
     __tablename__ = "reservas_stock"
+    __table_args__ = (
+        Index("ix_reservas_stock_pedido_activa", "pedido_id", postgresql_where=text("activa")),
+    )
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     pedido_id = Column(Integer, ForeignKey("pedidos.id"), nullable=False)
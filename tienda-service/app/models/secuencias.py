@@ -0,0 +1,35 @@
+# ============================================================================
+# secuencias.py
+#
+# Secuencias de base de datos para la numeración de pedidos, envíos y
+# devoluciones. Al crear el esquema se alinean con los números ya emitidos
+# para que la numeración continúe sin colisiones.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+from sqlalchemy import Sequence, event, text
+from ..database import Base
+
+PEDIDO_NUMERO_SEQ = Sequence("pedido_numero_seq", metadata=Base.metadata)
+ENVIO_NUMERO_SEQ = Sequence("envio_numero_seq", metadata=Base.metadata)
+DEVOLUCION_NUMERO_SEQ = Sequence("devolucion_numero_seq", metadata=Base.metadata)
+
+_NUMERACIONES = (
+    (PEDIDO_NUMERO_SEQ, "pedidos", "numero_pedido"),
+    (ENVIO_NUMERO_SEQ, "envios", "numero_envio"),
+    (DEVOLUCION_NUMERO_SEQ, "devoluciones", "numero_devolucion"),
+)
+
+@event.listens_for(Base.metadata, "after_create")
+def _sincronizar_secuencias(target, connection, **kw):
+    """Avanzar cada secuencia hasta el mayor número ya registrado en su tabla"""
+    if connection.dialect.name != "postgresql":
+        return
+    for secuencia, tabla, columna in _NUMERACIONES:
+        connection.execute(text(
+            f"SELECT setval('{secuencia.name}', m) FROM ("
+            f"SELECT MAX(CAST(substring({columna} FROM '[0-9]+$') AS BIGINT)) AS m FROM {tabla}"
+            f") ultimo WHERE m >= (SELECT last_value FROM {secuencia.name})"
+        ))
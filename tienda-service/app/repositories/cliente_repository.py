@@ -9,12 +9,19 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import Row, bindparam, func, select, update
 
-from ..models.cliente import Cliente
-from ..dtos.cliente_dto import ClienteCreateDTO, ClienteUpdateDTO
+from ..models.cliente import Cliente, TEXTO_BUSQUEDA_CLIENTE
+from ..dtos.cliente_dto import ClienteCreateDTO, ClienteUpdateDTO, CAMPOS_CLIENTE_RESPUESTA
+from .pagination import orden_keyset, paginar_keyset
+
+# Consultas por clave construidas una sola vez; SQLAlchemy reutiliza su forma compilada
+_CLIENTE_POR_CODIGO = select(Cliente).where(Cliente.codigo_cliente == bindparam("codigo_cliente"))
+
+# Los listados leen solo las columnas de la respuesta, sin hidratar entidades ORM
+_COLUMNAS_LISTADO = tuple(getattr(Cliente, campo) for campo in CAMPOS_CLIENTE_RESPUESTA)
 
 class ClienteRepository:
     """Repositorio para operaciones de clientes"""
@@ -27,30 +34,39 @@ class ClienteRepository:
         cliente = Cliente(**cliente_data.dict())
         self.db.add(cliente)
         self.db.commit()
-        self.db.refresh(cliente)
         return cliente
     
     def get_by_id(self, cliente_id: int) -> Optional[Cliente]:
-        """Obtener cliente por ID"""
-        return self.db.query(Cliente).filter(Cliente.id == cliente_id).first()
+        """Obtener cliente por ID, reutilizando la instancia ya cargada en la sesión"""
+        return self.db.get(Cliente, cliente_id)
     
     def get_by_codigo(self, codigo_cliente: str) -> Optional[Cliente]:
         """Obtener cliente por código"""
-        return self.db.query(Cliente).filter(Cliente.codigo_cliente == codigo_cliente).first()
+        return self.db.execute(_CLIENTE_POR_CODIGO, {"codigo_cliente": codigo_cliente}).scalar_one_or_none()
     
     def get_by_email(self, email: str) -> Optional[Cliente]:
         """Obtener cliente por email"""
         return self.db.query(Cliente).filter(Cliente.email == email).first()
     
-    def get_all(self, skip: int = 0, limit: int = 100, activo: Optional[bool] = None) -> List[Cliente]:
+    def get_all(self, skip: int = 0, limit: int = 100, activo: Optional[bool] = None) -> List[Row]:
         """Obtener todos los clientes con paginación"""
-        query = self.db.query(Cliente)
+        query = self.db.query(*_COLUMNAS_LISTADO).order_by(*orden_keyset(Cliente.created_at, Cliente.id))
         
         if activo is not None:
             query = query.filter(Cliente.activo == activo)
         
         return query.offset(skip).limit(limit).all()
     
+    def get_page(self, cursor: Optional[str] = None, limit: int = 100,
+                 activo: Optional[bool] = None) -> Tuple[List[Row], Optional[str]]:
+        """Obtener una página de clientes por cursor"""
+        query = self.db.query(*_COLUMNAS_LISTADO)
+        
+        if activo is not None:
+            query = query.filter(Cliente.activo == activo)
+        
+        return paginar_keyset(query, Cliente.created_at, Cliente.id, cursor, limit)
+    
     def count(self, activo: Optional[bool] = None) -> int:
         """Contar clientes"""
         query = self.db.query(func.count(Cliente.id))
@@ -61,38 +77,34 @@ class ClienteRepository:
         return query.scalar()
     
     def update(self, cliente_id: int, cliente_data: ClienteUpdateDTO) -> Optional[Cliente]:
-        """Actualizar un cliente"""
-        cliente = self.get_by_id(cliente_id)
-        if not cliente:
-            return None
-        
+        """Actualizar un cliente en una sola sentencia"""
         update_data = cliente_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(cliente, field, value)
-        
-        cliente.updated_at = func.current_timestamp()
+        cliente = self.db.scalars(
+            update(Cliente)
+            .where(Cliente.id == cliente_id)
+            .values(**update_data, updated_at=func.current_timestamp())
+            .returning(Cliente)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(cliente)
         return cliente
     
     def delete(self, cliente_id: int) -> bool:
-        """Eliminar un cliente (soft delete)"""
-        cliente = self.get_by_id(cliente_id)
-        if not cliente:
-            return False
-        
-        cliente.activo = False
-        cliente.updated_at = func.current_timestamp()
+        """Eliminar un cliente (soft delete) en una sola sentencia"""
+        desactivado = self.db.execute(
+            update(Cliente)
+            .where(Cliente.id == cliente_id)
+            .values(activo=False, updated_at=func.current_timestamp())
+            .returning(Cliente.id)
+        ).scalar_one_or_none()
         self.db.commit()
-        return True
+        return desactivado is not None
     
-    def search(self, term: str, skip: int = 0, limit: int = 100) -> List[Cliente]:
+    def search(self, term: str, skip: int = 0, limit: int = 100) -> List[Row]:
         """Buscar clientes por término"""
-        query = self.db.query(Cliente).filter(
-            (Cliente.nombre.ilike(f"%{term}%")) |
-            (Cliente.codigo_cliente.ilike(f"%{term}%")) |
-            (Cliente.email.ilike(f"%{term}%"))
-        )
+        # Un único ILIKE sobre el texto combinado aprovecha el índice GIN de trigramas
+        query = (self.db.query(*_COLUMNAS_LISTADO)
+                .filter(TEXTO_BUSQUEDA_CLIENTE.ilike(f"%{term}%"))
+                .order_by(func.similarity(TEXTO_BUSQUEDA_CLIENTE, term).desc(), Cliente.id))
         return query.offset(skip).limit(limit).all()
     
     def exists_codigo(self, codigo_cliente: str, exclude_id: Optional[int] = None) -> bool:
@@ -102,4 +114,4 @@ class ClienteRepository:
         if exclude_id:
             query = query.filter(Cliente.id != exclude_id)
         
-        return query.first() is not None
+        return self.db.query(query.exists()).scalar()
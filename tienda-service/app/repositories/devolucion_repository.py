@@ -9,12 +9,27 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import bindparam, func, desc, insert, select, update
 
 from ..models.devolucion import Devolucion, DevolucionDetalle
+from ..models.secuencias import DEVOLUCION_NUMERO_SEQ
 from ..dtos.devolucion_dto import DevolucionCreateDTO, DevolucionUpdateDTO
+from .pagination import orden_keyset, paginar_keyset
+
+# Consultas por clave construidas una sola vez; SQLAlchemy reutiliza su forma compilada
+_DEVOLUCION_POR_ID = (select(Devolucion)
+                      .options(joinedload(Devolucion.detalles),
+                               joinedload(Devolucion.pedido),
+                               joinedload(Devolucion.envio))
+                      .where(Devolucion.id == bindparam("devolucion_id")))
+_DEVOLUCION_CON_DETALLES = (select(Devolucion)
+                            .options(selectinload(Devolucion.detalles))
+                            .where(Devolucion.id == bindparam("devolucion_id")))
+_DEVOLUCION_POR_NUMERO = (select(Devolucion)
+                          .options(joinedload(Devolucion.detalles))
+                          .where(Devolucion.numero_devolucion == bindparam("numero_devolucion")))
 
 class DevolucionRepository:
     """Repositorio para operaciones de devoluciones"""
@@ -36,36 +51,29 @@ class DevolucionRepository:
         self.db.add(devolucion)
         self.db.flush()
         
-        for detalle_data in devolucion_data.detalles:
-            detalle = DevolucionDetalle(
-                devolucion_id=devolucion.id,
-                producto_id=detalle_data.producto_id,
-                cantidad_devuelta=detalle_data.cantidad_devuelta,
-                motivo_detalle=detalle_data.motivo_detalle,
-                estado_producto=detalle_data.estado_producto,
-                accion=detalle_data.accion
-            )
-            self.db.add(detalle)
+        # Inserción de todos los detalles en una sola sentencia
+        self.db.execute(
+            insert(DevolucionDetalle),
+            [
+                {"devolucion_id": devolucion.id, **detalle_data.model_dump()}
+                for detalle_data in devolucion_data.detalles
+            ]
+        )
         
         self.db.commit()
-        self.db.refresh(devolucion)
         return devolucion
     
     def get_by_id(self, devolucion_id: int) -> Optional[Devolucion]:
         """Obtener devolución por ID con sus detalles"""
-        return (self.db.query(Devolucion)
-                .options(joinedload(Devolucion.detalles), 
-                        joinedload(Devolucion.pedido),
-                        joinedload(Devolucion.envio))
-                .filter(Devolucion.id == devolucion_id)
-                .first())
+        return self.db.execute(_DEVOLUCION_POR_ID, {"devolucion_id": devolucion_id}).unique().scalar_one_or_none()
+    
+    def get_by_id_with_detalles(self, devolucion_id: int) -> Optional[Devolucion]:
+        """Obtener devolución por ID con sus detalles, sin cargar pedido ni envío"""
+        return self.db.execute(_DEVOLUCION_CON_DETALLES, {"devolucion_id": devolucion_id}).scalar_one_or_none()
     
     def get_by_numero(self, numero_devolucion: str) -> Optional[Devolucion]:
         """Obtener devolución por número"""
-        return (self.db.query(Devolucion)
-                .options(joinedload(Devolucion.detalles))
-                .filter(Devolucion.numero_devolucion == numero_devolucion)
-                .first())
+        return self.db.execute(_DEVOLUCION_POR_NUMERO, {"numero_devolucion": numero_devolucion}).unique().scalar_one_or_none()
     
     def get_by_pedido(self, pedido_id: int) -> List[Devolucion]:
         """Obtener devoluciones por pedido"""
@@ -80,13 +88,39 @@ class DevolucionRepository:
         query = (self.db.query(Devolucion)
                 .options(joinedload(Devolucion.detalles),
                         joinedload(Devolucion.pedido))
-                .order_by(desc(Devolucion.fecha_devolucion)))
+                .order_by(*orden_keyset(Devolucion.fecha_devolucion, Devolucion.id)))
         
         if estado:
             query = query.filter(Devolucion.estado == estado)
         
         return query.offset(skip).limit(limit).all()
     
+    def get_all_con_total(self, skip: int = 0, limit: int = 100,
+                          estado: Optional[str] = None) -> Tuple[List[Devolucion], Optional[int]]:
+        """Obtener una página de devoluciones y el total del filtro en una sola consulta"""
+        query = (self.db.query(Devolucion, func.count().over())
+                .options(joinedload(Devolucion.detalles),
+                        joinedload(Devolucion.pedido))
+                .order_by(*orden_keyset(Devolucion.fecha_devolucion, Devolucion.id)))
+        
+        if estado:
+            query = query.filter(Devolucion.estado == estado)
+        
+        filas = query.offset(skip).limit(limit).all()
+        return [devolucion for devolucion, _ in filas], (filas[0][1] if filas else None)
+    
+    def get_page(self, cursor: Optional[str] = None, limit: int = 100,
+                 estado: Optional[str] = None) -> Tuple[List[Devolucion], Optional[str]]:
+        """Obtener una página de devoluciones por cursor"""
+        query = (self.db.query(Devolucion)
+                .options(joinedload(Devolucion.detalles),
+                        joinedload(Devolucion.pedido)))
+        
+        if estado:
+            query = query.filter(Devolucion.estado == estado)
+        
+        return paginar_keyset(query, Devolucion.fecha_devolucion, Devolucion.id, cursor, limit)
+    
     def count(self, estado: Optional[str] = None) -> int:
         """Contar devoluciones"""
         query = self.db.query(func.count(Devolucion.id))
@@ -97,39 +131,35 @@ class DevolucionRepository:
         return query.scalar()
     
     def update(self, devolucion_id: int, devolucion_data: DevolucionUpdateDTO) -> Optional[Devolucion]:
-        """Actualizar una devolución"""
-        devolucion = self.get_by_id(devolucion_id)
-        if not devolucion:
-            return None
-        
+        """Actualizar una devolución en una sola sentencia"""
         update_data = devolucion_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(devolucion, field, value)
+        if not update_data:
+            return self.get_by_id(devolucion_id)
         
+        devolucion = self.db.scalars(
+            update(Devolucion).where(Devolucion.id == devolucion_id).values(**update_data).returning(Devolucion)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(devolucion)
         return devolucion
     
     def update_estado(self, devolucion_id: int, nuevo_estado: str, usuario: Optional[str] = None) -> Optional[Devolucion]:
-        """Actualizar estado de la devolución"""
-        devolucion = self.get_by_id(devolucion_id)
-        if not devolucion:
-            return None
-        
-        devolucion.estado = nuevo_estado
+        """Actualizar estado de la devolución en una sola sentencia"""
+        valores = {"estado": nuevo_estado}
         
         if usuario:
-            devolucion.usuario_procesamiento = usuario
-            devolucion.fecha_procesamiento = func.current_timestamp()
+            valores["usuario_procesamiento"] = usuario
+            valores["fecha_procesamiento"] = func.current_timestamp()
         
+        devolucion = self.db.scalars(
+            update(Devolucion).where(Devolucion.id == devolucion_id).values(**valores).returning(Devolucion)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(devolucion)
         return devolucion
     
     def get_detalles_by_producto(self, producto_id: int) -> List[DevolucionDetalle]:
         """Obtener detalles de devolución por producto"""
         return (self.db.query(DevolucionDetalle)
-                .options(joinedload(DevolucionDetalle.devolucion))
+                .options(joinedload(DevolucionDetalle.devolucion).selectinload(Devolucion.detalles))
                 .filter(DevolucionDetalle.producto_id == producto_id)
                 .all())
     
@@ -140,21 +170,9 @@ class DevolucionRepository:
         if exclude_id:
             query = query.filter(Devolucion.id != exclude_id)
         
-        return query.first() is not None
+        return self.db.query(query.exists()).scalar()
     
     def get_next_numero(self, prefix: str = "DEV") -> str:
-        """Generar el siguiente número de devolución"""
-        last_devolucion = (self.db.query(Devolucion)
-                          .filter(Devolucion.numero_devolucion.like(f"{prefix}%"))
-                          .order_by(desc(Devolucion.id))
-                          .first())
-        
-        if not last_devolucion:
-            return f"{prefix}000001"
-        
-        try:
-            last_number = int(last_devolucion.numero_devolucion.replace(prefix, ""))
-            next_number = last_number + 1
-            return f"{prefix}{next_number:06d}"
-        except ValueError:
-            return f"{prefix}000001"
+        """Generar el siguiente número de devolución a partir de su secuencia"""
+        numero = self.db.scalar(DEVOLUCION_NUMERO_SEQ.next_value())
+        return f"{prefix}{numero:06d}"
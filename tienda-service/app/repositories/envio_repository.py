@@ -9,12 +9,18 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc
+from sqlalchemy import bindparam, func, desc, select, update
 
 from ..models.envio import Envio
+from ..models.secuencias import ENVIO_NUMERO_SEQ
 from ..dtos.envio_dto import EnvioCreateDTO, EnvioUpdateDTO
+from .pagination import orden_keyset, paginar_keyset
+
+# Consultas por clave construidas una sola vez; SQLAlchemy reutiliza su forma compilada
+_ENVIO_POR_ID = select(Envio).options(joinedload(Envio.pedido)).where(Envio.id == bindparam("envio_id"))
+_ENVIO_POR_NUMERO = select(Envio).where(Envio.numero_envio == bindparam("numero_envio"))
 
 class EnvioRepository:
     """Repositorio para operaciones de envíos"""
@@ -39,19 +45,15 @@ class EnvioRepository:
         
         self.db.add(envio)
         self.db.commit()
-        self.db.refresh(envio)
         return envio
     
     def get_by_id(self, envio_id: int) -> Optional[Envio]:
         """Obtener envío por ID"""
-        return (self.db.query(Envio)
-                .options(joinedload(Envio.pedido))
-                .filter(Envio.id == envio_id)
-                .first())
+        return self.db.execute(_ENVIO_POR_ID, {"envio_id": envio_id}).scalar_one_or_none()
     
     def get_by_numero(self, numero_envio: str) -> Optional[Envio]:
         """Obtener envío por número"""
-        return self.db.query(Envio).filter(Envio.numero_envio == numero_envio).first()
+        return self.db.execute(_ENVIO_POR_NUMERO, {"numero_envio": numero_envio}).scalar_one_or_none()
     
     def get_by_pedido(self, pedido_id: int) -> List[Envio]:
         """Obtener envíos por pedido"""
@@ -64,13 +66,36 @@ class EnvioRepository:
         """Obtener todos los envíos con filtros"""
         query = (self.db.query(Envio)
                 .options(joinedload(Envio.pedido))
-                .order_by(desc(Envio.fecha_programada)))
+                .order_by(*orden_keyset(Envio.fecha_programada, Envio.id)))
         
         if estado:
             query = query.filter(Envio.estado == estado)
         
         return query.offset(skip).limit(limit).all()
     
+    def get_all_con_total(self, skip: int = 0, limit: int = 100,
+                          estado: Optional[str] = None) -> Tuple[List[Envio], Optional[int]]:
+        """Obtener una página de envíos y el total del filtro en una sola consulta"""
+        query = (self.db.query(Envio, func.count().over())
+                .options(joinedload(Envio.pedido))
+                .order_by(*orden_keyset(Envio.fecha_programada, Envio.id)))
+        
+        if estado:
+            query = query.filter(Envio.estado == estado)
+        
+        filas = query.offset(skip).limit(limit).all()
+        return [envio for envio, _ in filas], (filas[0][1] if filas else None)
+    
+    def get_page(self, cursor: Optional[str] = None, limit: int = 100,
+                 estado: Optional[str] = None) -> Tuple[List[Envio], Optional[str]]:
+        """Obtener una página de envíos por cursor"""
+        query = self.db.query(Envio).options(joinedload(Envio.pedido))
+        
+        if estado:
+            query = query.filter(Envio.estado == estado)
+        
+        return paginar_keyset(query, Envio.fecha_programada, Envio.id, cursor, limit)
+    
     def count(self, estado: Optional[str] = None) -> int:
         """Contar envíos"""
         query = self.db.query(func.count(Envio.id))
@@ -81,34 +106,43 @@ class EnvioRepository:
         return query.scalar()
     
     def update(self, envio_id: int, envio_data: EnvioUpdateDTO) -> Optional[Envio]:
-        """Actualizar un envío"""
-        envio = self.get_by_id(envio_id)
-        if not envio:
-            return None
-        
+        """Actualizar un envío en una sola sentencia"""
         update_data = envio_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(envio, field, value)
+        if not update_data:
+            return self.get_by_id(envio_id)
         
+        envio = self.db.scalars(
+            update(Envio).where(Envio.id == envio_id).values(**update_data).returning(Envio)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(envio)
         return envio
     
-    def update_estado(self, envio_id: int, nuevo_estado: str) -> Optional[Envio]:
-        """Actualizar estado del envío"""
-        envio = self.get_by_id(envio_id)
-        if not envio:
-            return None
+    def update_estado(self, envio_id: int, nuevo_estado: str, commit: bool = True) -> Optional[Envio]:
+        """Actualizar estado del envío en una sola sentencia; con commit=False queda en la transacción en curso"""
+        valores = {"estado": nuevo_estado}
         
-        envio.estado = nuevo_estado
-        
-        if nuevo_estado == "en_transito" and not envio.fecha_salida:
-            envio.fecha_salida = func.current_timestamp()
-        elif nuevo_estado == "entregado" and not envio.fecha_entrega:
-            envio.fecha_entrega = func.current_timestamp()
+        # Las fechas de salida y entrega solo se fijan la primera vez
+        if nuevo_estado == "en_transito":
+            valores["fecha_salida"] = func.coalesce(Envio.fecha_salida, func.current_timestamp())
+        elif nuevo_estado == "entregado":
+            valores["fecha_entrega"] = func.coalesce(Envio.fecha_entrega, func.current_timestamp())
         
+        envio = self.db.scalars(
+            update(Envio).where(Envio.id == envio_id).values(**valores).returning(Envio)
+        ).one_or_none()
+        if commit:
+            self.db.commit()
+        return envio
+    
+    def cancelar(self, envio_id: int, motivo: str) -> Optional[Envio]:
+        """Cancelar un envío en una sola sentencia si su estado lo permite"""
+        envio = self.db.scalars(
+            update(Envio)
+            .where(Envio.id == envio_id, Envio.estado.notin_(["entregado", "cancelado"]))
+            .values(estado="cancelado", observaciones=f"Cancelado: {motivo}")
+            .returning(Envio)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(envio)
         return envio
     
     def exists_numero(self, numero_envio: str, exclude_id: Optional[int] = None) -> bool:
@@ -118,21 +152,9 @@ class EnvioRepository:
         if exclude_id:
             query = query.filter(Envio.id != exclude_id)
         
-        return query.first() is not None
+        return self.db.query(query.exists()).scalar()
     
     def get_next_numero(self, prefix: str = "ENV") -> str:
-        """Generar el siguiente número de envío"""
-        last_envio = (self.db.query(Envio)
-                     .filter(Envio.numero_envio.like(f"{prefix}%"))
-                     .order_by(desc(Envio.id))
-                     .first())
-        
-        if not last_envio:
-            return f"{prefix}000001"
-        
-        try:
-            last_number = int(last_envio.numero_envio.replace(prefix, ""))
-            next_number = last_number + 1
-            return f"{prefix}{next_number:06d}"
-        except ValueError:
-            return f"{prefix}000001"
+        """Generar el siguiente número de envío a partir de su secuencia"""
+        numero = self.db.scalar(ENVIO_NUMERO_SEQ.next_value())
+        return f"{prefix}{numero:06d}"
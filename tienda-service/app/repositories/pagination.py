@@ -0,0 +1,87 @@
+# ============================================================================
+# pagination.py
+#
+# Paginación por cursor (keyset) para los listados del servicio de tienda.
+# El cursor es opaco para el cliente y codifica la fecha de ordenación y el
+# ID de la última fila entregada, de modo que cada página se obtiene con
+# una búsqueda en el índice sin recorrer las filas de páginas anteriores.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, tuple_
+from sqlalchemy.orm import Query
+
+from ..exceptions.api_exceptions import ValidationError
+
+def encode_cursor(fecha: Optional[datetime], ultimo_id: int) -> str:
+    """Codificar la posición de la última fila entregada como cursor opaco"""
+    valor = f"{fecha.isoformat() if fecha else ''}|{ultimo_id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Decodificar un cursor en (fecha, id)"""
+    try:
+        fecha, ultimo_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(fecha) if fecha else None), int(ultimo_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValidationError("cursor", cursor, "Cursor de paginación inválido")
+
+def orden_keyset(columna_fecha, columna_id) -> tuple:
+    """Orden descendente por fecha e ID; las filas sin fecha van primero, como en PostgreSQL"""
+    return columna_fecha.desc().nulls_first(), columna_id.desc()
+
+def _desde_cursor(query: Query, columna_fecha, columna_id, cursor: Optional[str]) -> Query:
+    """Filtrar las filas posteriores a la posición codificada en el cursor"""
+    if not cursor:
+        return query
+
+    fecha, ultimo_id = decode_cursor(cursor)
+    if fecha is None:
+        return query.filter(or_(
+            and_(columna_fecha.is_(None), columna_id < ultimo_id),
+            columna_fecha.isnot(None)
+        ))
+    return query.filter(tuple_(columna_fecha, columna_id) < tuple_(fecha, ultimo_id))
+
+def paginar_keyset(query: Query, columna_fecha, columna_id, cursor: Optional[str],
+                   limit: int) -> Tuple[List[Any], Optional[str]]:
+    """Obtener una página a partir del cursor y el cursor de la página siguiente"""
+    query = _desde_cursor(query, columna_fecha, columna_id, cursor)
+    query = query.order_by(*orden_keyset(columna_fecha, columna_id))
+
+    # Se pide una fila extra para saber si existe una página siguiente
+    filas = query.limit(limit + 1).all()
+    if len(filas) <= limit:
+        return filas, None
+
+    filas = filas[:limit]
+    ultima = filas[-1]
+    return filas, encode_cursor(getattr(ultima, columna_fecha.key), ultima.id)
+
+def cursores_keyset(query: Query, columna_fecha, columna_id, cursor: Optional[str],
+                    limit: int, paginas: int) -> List[Optional[str]]:
+    """Obtener en una sola consulta los cursores de inicio de varias páginas consecutivas
+
+    El primer cursor es el recibido; los siguientes corresponden a la última fila de
+    cada página, de modo que el cliente puede pedir todas las páginas en paralelo.
+    """
+    orden = orden_keyset(columna_fecha, columna_id)
+    query = _desde_cursor(query, columna_fecha, columna_id, cursor)
+    ordenadas = (query
+                 .with_entities(columna_fecha, columna_id,
+                                func.row_number().over(order_by=orden).label("fila"))
+                 .order_by(*orden)
+                 .limit(limit * (paginas - 1))
+                 .subquery())
+    limites = (query.session.query(ordenadas)
+               .filter(ordenadas.c.fila % limit == 0)
+               .order_by(ordenadas.c.fila))
+
+    return [cursor] + [encode_cursor(fecha, ultimo_id) for fecha, ultimo_id, _ in limites]
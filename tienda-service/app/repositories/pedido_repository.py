@@ -9,14 +9,27 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc
-from decimal import Decimal
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import bindparam, func, insert, select, update
+from decimal import Decimal, ROUND_HALF_UP
 
 from ..models.pedido import Pedido, PedidoDetalle
 from ..models.reserva_stock import ReservaStock
+from ..models.secuencias import PEDIDO_NUMERO_SEQ
 from ..dtos.pedido_dto import PedidoCreateDTO, PedidoUpdateDTO
+from .pagination import cursores_keyset, orden_keyset, paginar_keyset
+
+# Consultas por clave construidas una sola vez; SQLAlchemy reutiliza su forma compilada
+# Los detalles se cargan con un SELECT ... IN aparte para no repetir las columnas del pedido por línea
+_PEDIDO_POR_ID = (select(Pedido)
+                  .options(selectinload(Pedido.detalles), joinedload(Pedido.cliente))
+                  .where(Pedido.id == bindparam("pedido_id")))
+_PEDIDO_POR_NUMERO = (select(Pedido)
+                      .options(selectinload(Pedido.detalles), joinedload(Pedido.cliente))
+                      .where(Pedido.numero_pedido == bindparam("numero_pedido")))
+
+_CENTIMO = Decimal("0.01")
 
 class PedidoRepository:
     """Repositorio para operaciones de pedidos"""
@@ -24,8 +37,25 @@ class PedidoRepository:
     def __init__(self, db: Session):
         self.db = db
     
-    def create(self, pedido_data: PedidoCreateDTO, numero_pedido: str, usuario_creacion: str) -> Pedido:
+    def create(self, pedido_data: PedidoCreateDTO, numero_pedido: str, usuario_creacion: str,
+               commit: bool = True) -> Pedido:
         """Crear un nuevo pedido con sus detalles"""
+        lineas = [
+            {
+                "producto_id": detalle_data.producto_id,
+                "cantidad": detalle_data.cantidad,
+                "precio_unitario": detalle_data.precio_unitario,
+                "descuento_linea": detalle_data.descuento_linea,
+                "subtotal_linea": (
+                    detalle_data.cantidad * detalle_data.precio_unitario - detalle_data.descuento_linea
+                ).quantize(_CENTIMO, ROUND_HALF_UP)
+            }
+            for detalle_data in pedido_data.detalles
+        ]
+        # Los totales viajan en el INSERT del pedido, sin un UPDATE posterior
+        # Los importes se redondean como las columnas Numeric(12, 2), para que la respuesta coincida con lecturas posteriores
+        subtotal = sum((linea["subtotal_linea"] for linea in lineas), Decimal('0.00'))
+        
         pedido = Pedido(
             numero_pedido=numero_pedido,
             cliente_id=pedido_data.cliente_id,
@@ -37,54 +67,39 @@ class PedidoRepository:
             observaciones=pedido_data.observaciones,
             prioridad=pedido_data.prioridad,
             usuario_creacion=usuario_creacion,
-            estado="borrador"
+            estado="borrador",
+            subtotal=subtotal,
+            total=subtotal
         )
         
         self.db.add(pedido)
         self.db.flush()
         
-        subtotal = Decimal('0')
-        for detalle_data in pedido_data.detalles:
-            subtotal_linea = detalle_data.cantidad * detalle_data.precio_unitario - detalle_data.descuento_linea
-            
-            detalle = PedidoDetalle(
-                pedido_id=pedido.id,
-                producto_id=detalle_data.producto_id,
-                cantidad=detalle_data.cantidad,
-                precio_unitario=detalle_data.precio_unitario,
-                descuento_linea=detalle_data.descuento_linea,
-                subtotal_linea=subtotal_linea
-            )
-            self.db.add(detalle)
-            subtotal += subtotal_linea
-        
-        pedido.subtotal = subtotal
-        pedido.total = subtotal
+        # Inserción de todos los detalles en una sola sentencia
+        self.db.execute(insert(PedidoDetalle), [{"pedido_id": pedido.id, **linea} for linea in lineas])
         
-        self.db.commit()
-        self.db.refresh(pedido)
+        if commit:
+            self.db.commit()
         return pedido
     
     def get_by_id(self, pedido_id: int) -> Optional[Pedido]:
         """Obtener pedido por ID con sus detalles"""
-        return (self.db.query(Pedido)
-                .options(joinedload(Pedido.detalles), joinedload(Pedido.cliente))
-                .filter(Pedido.id == pedido_id)
-                .first())
+        return self.db.execute(_PEDIDO_POR_ID, {"pedido_id": pedido_id}).unique().scalar_one_or_none()
     
     def get_by_numero(self, numero_pedido: str) -> Optional[Pedido]:
         """Obtener pedido por número"""
-        return (self.db.query(Pedido)
-                .options(joinedload(Pedido.detalles))
-                .filter(Pedido.numero_pedido == numero_pedido)
-                .first())
+        return self.db.execute(_PEDIDO_POR_NUMERO, {"numero_pedido": numero_pedido}).unique().scalar_one_or_none()
+    
+    def get_estado(self, pedido_id: int) -> Optional[str]:
+        """Leer el estado vigente del pedido en la base de datos"""
+        return self.db.scalar(select(Pedido.estado).where(Pedido.id == pedido_id))
     
     def get_all(self, skip: int = 0, limit: int = 100, cliente_id: Optional[int] = None, 
                 estado: Optional[str] = None) -> List[Pedido]:
         """Obtener todos los pedidos con filtros"""
         query = (self.db.query(Pedido)
-                .options(joinedload(Pedido.detalles), joinedload(Pedido.cliente))
-                .order_by(desc(Pedido.fecha_pedido)))
+                .options(selectinload(Pedido.detalles), joinedload(Pedido.cliente))
+                .order_by(*orden_keyset(Pedido.fecha_pedido, Pedido.id)))
         
         if cliente_id:
             query = query.filter(Pedido.cliente_id == cliente_id)
@@ -94,6 +109,48 @@ class PedidoRepository:
         
         return query.offset(skip).limit(limit).all()
     
+    def get_all_con_total(self, skip: int = 0, limit: int = 100, cliente_id: Optional[int] = None,
+                          estado: Optional[str] = None) -> Tuple[List[Pedido], Optional[int]]:
+        """Obtener una página de pedidos y el total del filtro en una sola consulta"""
+        query = (self.db.query(Pedido, func.count().over())
+                .options(selectinload(Pedido.detalles), joinedload(Pedido.cliente))
+                .order_by(*orden_keyset(Pedido.fecha_pedido, Pedido.id)))
+        
+        if cliente_id:
+            query = query.filter(Pedido.cliente_id == cliente_id)
+        
+        if estado:
+            query = query.filter(Pedido.estado == estado)
+        
+        filas = query.offset(skip).limit(limit).all()
+        return [pedido for pedido, _ in filas], (filas[0][1] if filas else None)
+    
+    def get_page(self, cursor: Optional[str] = None, limit: int = 100, cliente_id: Optional[int] = None,
+                 estado: Optional[str] = None) -> Tuple[List[Pedido], Optional[str]]:
+        """Obtener una página de pedidos por cursor"""
+        query = self.db.query(Pedido).options(selectinload(Pedido.detalles), joinedload(Pedido.cliente))
+        
+        if cliente_id:
+            query = query.filter(Pedido.cliente_id == cliente_id)
+        
+        if estado:
+            query = query.filter(Pedido.estado == estado)
+        
+        return paginar_keyset(query, Pedido.fecha_pedido, Pedido.id, cursor, limit)
+    
+    def get_cursores(self, cursor: Optional[str] = None, limit: int = 100, paginas: int = 2,
+                     cliente_id: Optional[int] = None, estado: Optional[str] = None) -> List[Optional[str]]:
+        """Obtener los cursores de inicio de varias páginas consecutivas de pedidos"""
+        query = self.db.query(Pedido)
+        
+        if cliente_id:
+            query = query.filter(Pedido.cliente_id == cliente_id)
+        
+        if estado:
+            query = query.filter(Pedido.estado == estado)
+        
+        return cursores_keyset(query, Pedido.fecha_pedido, Pedido.id, cursor, limit, paginas)
+    
     def count(self, cliente_id: Optional[int] = None, estado: Optional[str] = None) -> int:
         """Contar pedidos"""
         query = self.db.query(func.count(Pedido.id))
@@ -107,42 +164,57 @@ class PedidoRepository:
         return query.scalar()
     
     def update(self, pedido_id: int, pedido_data: PedidoUpdateDTO) -> Optional[Pedido]:
-        """Actualizar un pedido"""
-        pedido = self.get_by_id(pedido_id)
-        if not pedido:
-            return None
-        
+        """Actualizar un pedido en una sola sentencia"""
         update_data = pedido_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(pedido, field, value)
+        if not update_data:
+            return self.get_by_id(pedido_id)
         
+        pedido = self.db.scalars(
+            update(Pedido).where(Pedido.id == pedido_id).values(**update_data).returning(Pedido)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(pedido)
         return pedido
     
-    def update_estado(self, pedido_id: int, nuevo_estado: str, usuario: Optional[str] = None) -> Optional[Pedido]:
-        """Actualizar estado del pedido"""
-        pedido = self.get_by_id(pedido_id)
-        if not pedido:
-            return None
-        
-        pedido.estado = nuevo_estado
+    def update_estado(self, pedido_id: int, nuevo_estado: str, usuario: Optional[str] = None,
+                      estado_requerido: Optional[str] = None, commit: bool = True) -> Optional[Pedido]:
+        """Actualizar estado del pedido en una sola sentencia, opcionalmente solo desde estado_requerido"""
+        valores = {"estado": nuevo_estado}
         
         if nuevo_estado == "confirmado" and usuario:
-            pedido.usuario_aprobacion = usuario
-            pedido.fecha_aprobacion = func.current_timestamp()
+            valores["usuario_aprobacion"] = usuario
+            valores["fecha_aprobacion"] = func.current_timestamp()
+        
+        sentencia = update(Pedido).where(Pedido.id == pedido_id)
+        if estado_requerido is not None:
+            sentencia = sentencia.where(Pedido.estado == estado_requerido)
         
+        pedido = self.db.scalars(sentencia.values(**valores).returning(Pedido)).one_or_none()
+        if commit:
+            self.db.commit()
+        return pedido
+    
+    def cancelar(self, pedido_id: int, motivo: str, usuario: str) -> Optional[Pedido]:
+        """Cancelar un pedido en una sola sentencia si su estado lo permite"""
+        pedido = self.db.scalars(
+            update(Pedido)
+            .where(Pedido.id == pedido_id, Pedido.estado.in_(["borrador", "pendiente", "confirmado"]))
+            .values(estado="cancelado", motivo_cancelacion=motivo, usuario_aprobacion=usuario)
+            .returning(Pedido)
+        ).one_or_none()
         self.db.commit()
-        self.db.refresh(pedido)
         return pedido
     
     def get_detalles_by_producto(self, producto_id: int) -> List[PedidoDetalle]:
         """Obtener detalles de pedido por producto"""
         return (self.db.query(PedidoDetalle)
-                .options(joinedload(PedidoDetalle.pedido))
+                .options(joinedload(PedidoDetalle.pedido).selectinload(Pedido.detalles))
                 .filter(PedidoDetalle.producto_id == producto_id)
                 .all())
     
+    def exists(self, pedido_id: int) -> bool:
+        """Verificar si existe un pedido sin cargar sus datos"""
+        return self.db.query(self.db.query(Pedido).filter(Pedido.id == pedido_id).exists()).scalar()
+    
     def exists_numero(self, numero_pedido: str, exclude_id: Optional[int] = None) -> bool:
         """Verificar si existe un número de pedido"""
         query = self.db.query(Pedido).filter(Pedido.numero_pedido == numero_pedido)
@@ -150,24 +222,12 @@ class PedidoRepository:
         if exclude_id:
             query = query.filter(Pedido.id != exclude_id)
         
-        return query.first() is not None
+        return self.db.query(query.exists()).scalar()
     
     def get_next_numero(self, prefix: str = "PED") -> str:
-        """Generar el siguiente número de pedido"""
-        last_pedido = (self.db.query(Pedido)
-                      .filter(Pedido.numero_pedido.like(f"{prefix}%"))
-                      .order_by(desc(Pedido.id))
-                      .first())
-        
-        if not last_pedido:
-            return f"{prefix}000001"
-        
-        try:
-            last_number = int(last_pedido.numero_pedido.replace(prefix, ""))
-            next_number = last_number + 1
-            return f"{prefix}{next_number:06d}"
-        except ValueError:
-            return f"{prefix}000001"
+        """Generar el siguiente número de pedido a partir de su secuencia"""
+        numero = self.db.scalar(PEDIDO_NUMERO_SEQ.next_value())
+        return f"{prefix}{numero:06d}"
 
 class ReservaStockRepository:
     """Repositorio para operaciones de reserva de stock"""
@@ -185,24 +245,32 @@ class ReservaStockRepository:
         )
         self.db.add(reserva)
         self.db.commit()
-        self.db.refresh(reserva)
         return reserva
     
+    def create_reservas(self, pedido_id: int, reservas: List[dict]) -> None:
+        """Crear todas las reservas de un pedido en una sola sentencia"""
+        if not reservas:
+            return
+        self.db.execute(insert(ReservaStock), [{"pedido_id": pedido_id, **reserva} for reserva in reservas])
+        self.db.commit()
+    
     def get_by_pedido(self, pedido_id: int) -> List[ReservaStock]:
         """Obtener reservas por pedido"""
         return self.db.query(ReservaStock).filter(ReservaStock.pedido_id == pedido_id).all()
     
     def liberar_reservas(self, pedido_id: int) -> bool:
         """Liberar reservas de un pedido"""
-        reservas = self.get_by_pedido(pedido_id)
-        for reserva in reservas:
-            reserva.activa = False
-        
+        self.db.execute(
+            update(ReservaStock)
+            .where(ReservaStock.pedido_id == pedido_id, ReservaStock.activa.is_(True))
+            .values(activa=False)
+        )
         self.db.commit()
         return True
     
-    def delete_reservas(self, pedido_id: int) -> bool:
+    def delete_reservas(self, pedido_id: int, commit: bool = True) -> bool:
         """Eliminar reservas de un pedido"""
         self.db.query(ReservaStock).filter(ReservaStock.pedido_id == pedido_id).delete()
-        self.db.commit()
+        if commit:
+            self.db.commit()
         return True
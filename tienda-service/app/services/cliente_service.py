@@ -9,13 +9,18 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from decimal import Decimal
 from sqlalchemy.orm import Session
 
 from ..repositories.cliente_repository import ClienteRepository
-from ..dtos.cliente_dto import ClienteCreateDTO, ClienteUpdateDTO, ClienteResponseDTO, ClienteListResponseDTO
+from ..dtos.cliente_dto import (
+    ClienteCreateDTO, ClienteUpdateDTO, ClienteResponseDTO, ClienteListResponseDTO, cliente_response_desde_fila
+)
 from ..exceptions.api_exceptions import ClienteNotFoundError, CodigoClienteExisteError, ClienteInactivoError
 from ..models.cliente import Cliente
+from ..cache import cache_get, cache_set, cache_delete, credito_key
+from ..config import settings
 
 class ClienteService:
     """Servicio para lógica de negocio de clientes"""
@@ -23,6 +28,14 @@ class ClienteService:
     def __init__(self, db: Session):
         self.db = db
         self.cliente_repo = ClienteRepository(db)
+        # Clientes ya leídos durante esta petición; se descartan al escribir
+        self._clientes: Dict[int, Optional[Cliente]] = {}
+    
+    def _get_cliente(self, cliente_id: int) -> Optional[Cliente]:
+        """Obtener un cliente una sola vez por instancia del servicio"""
+        if cliente_id not in self._clientes:
+            self._clientes[cliente_id] = self.cliente_repo.get_by_id(cliente_id)
+        return self._clientes[cliente_id]
     
     def crear_cliente(self, cliente_data: ClienteCreateDTO) -> ClienteResponseDTO:
         """Crear un nuevo cliente"""
@@ -34,7 +47,7 @@ class ClienteService:
     
     def obtener_cliente(self, cliente_id: int) -> ClienteResponseDTO:
         """Obtener un cliente por ID"""
-        cliente = self.cliente_repo.get_by_id(cliente_id)
+        cliente = self._get_cliente(cliente_id)
         if not cliente:
             raise ClienteNotFoundError(cliente_id)
         
@@ -48,45 +61,55 @@ class ClienteService:
         
         return ClienteResponseDTO.from_orm(cliente)
     
-    def listar_clientes(self, page: int = 1, page_size: int = 100, activo: Optional[bool] = None) -> ClienteListResponseDTO:
+    def listar_clientes(self, page: int = 1, page_size: int = 100, activo: Optional[bool] = None,
+                        include_total: bool = False, cursor: Optional[str] = None) -> ClienteListResponseDTO:
         """Listar clientes con paginación"""
-        skip = (page - 1) * page_size
-        clientes = self.cliente_repo.get_all(skip=skip, limit=page_size, activo=activo)
-        total = self.cliente_repo.count(activo=activo)
+        if cursor is None and page > 1:
+            # Paginación por número de página, conservada por compatibilidad
+            clientes = self.cliente_repo.get_all(skip=(page - 1) * page_size, limit=page_size, activo=activo)
+            next_cursor = None
+        else:
+            clientes, next_cursor = self.cliente_repo.get_page(cursor, page_size, activo=activo)
+        total = self.cliente_repo.count(activo=activo) if include_total else None
         
-        clientes_dto = [ClienteResponseDTO.from_orm(cliente) for cliente in clientes]
+        clientes_dto = [cliente_response_desde_fila(fila) for fila in clientes]
         
         return ClienteListResponseDTO(
             clientes=clientes_dto,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
     
     def actualizar_cliente(self, cliente_id: int, cliente_data: ClienteUpdateDTO) -> ClienteResponseDTO:
         """Actualizar un cliente"""
-        if not self.cliente_repo.get_by_id(cliente_id):
+        if not self._get_cliente(cliente_id):
             raise ClienteNotFoundError(cliente_id)
         
         if cliente_data.codigo_cliente and self.cliente_repo.exists_codigo(cliente_data.codigo_cliente, exclude_id=cliente_id):
             raise CodigoClienteExisteError(cliente_data.codigo_cliente)
         
         cliente = self.cliente_repo.update(cliente_id, cliente_data)
+        self._clientes.pop(cliente_id, None)
+        cache_delete(credito_key(cliente_id))
         return ClienteResponseDTO.from_orm(cliente)
     
     def desactivar_cliente(self, cliente_id: int) -> bool:
         """Desactivar un cliente"""
-        if not self.cliente_repo.get_by_id(cliente_id):
+        if not self.cliente_repo.delete(cliente_id):
             raise ClienteNotFoundError(cliente_id)
         
-        return self.cliente_repo.delete(cliente_id)
+        self._clientes.pop(cliente_id, None)
+        cache_delete(credito_key(cliente_id))
+        return True
     
     def buscar_clientes(self, term: str, page: int = 1, page_size: int = 100) -> ClienteListResponseDTO:
         """Buscar clientes por término"""
         skip = (page - 1) * page_size
         clientes = self.cliente_repo.search(term, skip=skip, limit=page_size)
         
-        clientes_dto = [ClienteResponseDTO.from_orm(cliente) for cliente in clientes]
+        clientes_dto = [cliente_response_desde_fila(fila) for fila in clientes]
         
         return ClienteListResponseDTO(
             clientes=clientes_dto,
@@ -97,7 +120,7 @@ class ClienteService:
     
     def validar_cliente_activo(self, cliente_id: int) -> Cliente:
         """Validar que un cliente existe y está activo"""
-        cliente = self.cliente_repo.get_by_id(cliente_id)
+        cliente = self._get_cliente(cliente_id)
         if not cliente:
             raise ClienteNotFoundError(cliente_id)
         
@@ -106,11 +129,27 @@ class ClienteService:
         
         return cliente
     
-    def validar_limite_credito(self, cliente_id: int, monto: float) -> bool:
-        """Validar si el cliente puede realizar una compra basado en su límite de crédito"""
-        cliente = self.validar_cliente_activo(cliente_id)
+    def obtener_credito(self, cliente_id: int) -> dict:
+        """Obtener la proyección de crédito del cliente, usando la caché de Redis"""
+        credito = cache_get(credito_key(cliente_id))
+        if credito is None:
+            cliente = self._get_cliente(cliente_id)
+            if not cliente:
+                raise ClienteNotFoundError(cliente_id)
+            
+            credito = {"activo": cliente.activo, "limite_credito": str(cliente.limite_credito)}
+            cache_set(credito_key(cliente_id), credito, settings.credito_cache_ttl)
+        
+        return credito
+    
+    def validar_limite_credito(self, cliente_id: int, monto: Decimal) -> Tuple[bool, Decimal]:
+        """Validar si el cliente puede realizar una compra; devuelve el resultado y el límite consultado"""
+        credito = self.obtener_credito(cliente_id)
+        if not credito["activo"]:
+            raise ClienteInactivoError(cliente_id)
         
-        if cliente.limite_credito <= 0:
-            return True
+        limite_credito = Decimal(credito["limite_credito"])
+        if limite_credito <= 0:
+            return True, limite_credito
         
-        return monto <= float(cliente.limite_credito)
+        return monto <= limite_credito, limite_credito
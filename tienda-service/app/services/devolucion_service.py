@@ -10,6 +10,7 @@
 # ============================================================================
 
 from typing import List, Optional
+import httpx
 from sqlalchemy.orm import Session
 
 from ..repositories.devolucion_repository import DevolucionRepository
@@ -18,7 +19,7 @@ from ..repositories.envio_repository import EnvioRepository
 from ..services.external_service import ExternalService
 from ..dtos.devolucion_dto import (
     DevolucionCreateDTO, DevolucionUpdateDTO, 
-    DevolucionResponseDTO, DevolucionListResponseDTO
+    DevolucionResponseDTO, DevolucionListResponseDTO, devolucion_response_desde_orm
 )
 from ..exceptions.api_exceptions import (
     DevolucionNotFoundError, PedidoNotFoundError, 
@@ -26,15 +27,18 @@ from ..exceptions.api_exceptions import (
 )
 from ..config import settings
 
+_ESTADOS_PEDIDO_DEVOLVIBLE = frozenset({"entregado", "enviado"})
+_ESTADOS_DEVOLUCION_RECHAZABLE = frozenset({"recibida", "inspeccionada"})
+
 class DevolucionService:
     """Servicio para lógica de negocio de devoluciones"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, http_client: Optional[httpx.AsyncClient] = None):
         self.db = db
         self.devolucion_repo = DevolucionRepository(db)
         self.pedido_repo = PedidoRepository(db)
         self.envio_repo = EnvioRepository(db)
-        self.external_service = ExternalService()
+        self.external_service = ExternalService(http_client)
     
     def crear_devolucion(self, devolucion_data: DevolucionCreateDTO) -> DevolucionResponseDTO:
         """Crear una nueva devolución"""
@@ -42,7 +46,7 @@ class DevolucionService:
         if not pedido:
             raise PedidoNotFoundError(devolucion_data.pedido_id)
         
-        if pedido.estado not in ["entregado", "enviado"]:
+        if pedido.estado not in _ESTADOS_PEDIDO_DEVOLVIBLE:
             raise PedidoEstadoInvalidoError(
                 devolucion_data.pedido_id,
                 pedido.estado,
@@ -71,7 +75,7 @@ class DevolucionService:
             }
         )
         
-        return DevolucionResponseDTO.from_orm(devolucion)
+        return devolucion_response_desde_orm(devolucion)
     
     def obtener_devolucion(self, devolucion_id: int) -> DevolucionResponseDTO:
         """Obtener una devolución por ID"""
@@ -79,7 +83,7 @@ class DevolucionService:
         if not devolucion:
             raise DevolucionNotFoundError(devolucion_id)
         
-        return DevolucionResponseDTO.from_orm(devolucion)
+        return devolucion_response_desde_orm(devolucion)
     
     def obtener_devolucion_por_numero(self, numero_devolucion: str) -> DevolucionResponseDTO:
         """Obtener una devolución por número"""
@@ -87,30 +91,43 @@ class DevolucionService:
         if not devolucion:
             raise DevolucionNotFoundError(f"Número: {numero_devolucion}")
         
-        return DevolucionResponseDTO.from_orm(devolucion)
+        return devolucion_response_desde_orm(devolucion)
     
     def obtener_devoluciones_pedido(self, pedido_id: int) -> List[DevolucionResponseDTO]:
         """Obtener todas las devoluciones de un pedido"""
-        if not self.pedido_repo.get_by_id(pedido_id):
+        if not self.pedido_repo.exists(pedido_id):
             raise PedidoNotFoundError(pedido_id)
         
         devoluciones = self.devolucion_repo.get_by_pedido(pedido_id)
-        return [DevolucionResponseDTO.from_orm(devolucion) for devolucion in devoluciones]
+        return [devolucion_response_desde_orm(devolucion) for devolucion in devoluciones]
     
     def listar_devoluciones(self, page: int = 1, page_size: int = 100, 
-                           estado: Optional[str] = None) -> DevolucionListResponseDTO:
+                           estado: Optional[str] = None,
+                           include_total: bool = False, cursor: Optional[str] = None) -> DevolucionListResponseDTO:
         """Listar devoluciones con filtros y paginación"""
-        skip = (page - 1) * page_size
-        devoluciones = self.devolucion_repo.get_all(skip=skip, limit=page_size, estado=estado)
-        total = self.devolucion_repo.count(estado=estado)
-        
-        devoluciones_dto = [DevolucionResponseDTO.from_orm(devolucion) for devolucion in devoluciones]
+        if cursor is None and page > 1:
+            # Paginación por número de página, conservada por compatibilidad
+            skip = (page - 1) * page_size
+            if include_total:
+                # El total llega con las filas de la página, en la misma consulta
+                devoluciones, total = self.devolucion_repo.get_all_con_total(skip=skip, limit=page_size, estado=estado)
+            else:
+                devoluciones, total = self.devolucion_repo.get_all(skip=skip, limit=page_size, estado=estado), None
+            next_cursor = None
+        else:
+            devoluciones, next_cursor = self.devolucion_repo.get_page(cursor, page_size, estado=estado)
+            total = None
+        if include_total and total is None:
+            total = self.devolucion_repo.count(estado=estado)
+        
+        devoluciones_dto = [devolucion_response_desde_orm(devolucion) for devolucion in devoluciones]
         
         return DevolucionListResponseDTO(
             devoluciones=devoluciones_dto,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
     
     def actualizar_devolucion(self, devolucion_id: int, devolucion_data: DevolucionUpdateDTO) -> DevolucionResponseDTO:
@@ -132,7 +149,7 @@ class DevolucionService:
                 }
             )
         
-        return DevolucionResponseDTO.from_orm(devolucion_actualizada)
+        return devolucion_response_desde_orm(devolucion_actualizada)
     
     def inspeccionar_devolucion(self, devolucion_id: int, usuario: str) -> DevolucionResponseDTO:
         """Marcar devolución como inspeccionada"""
@@ -155,11 +172,11 @@ class DevolucionService:
             {"devolucion_id": devolucion_id, "inspector": usuario}
         )
         
-        return DevolucionResponseDTO.from_orm(devolucion_actualizada)
+        return devolucion_response_desde_orm(devolucion_actualizada)
     
     async def aprobar_devolucion(self, devolucion_id: int, usuario: str) -> DevolucionResponseDTO:
         """Aprobar devolución y procesar reintegro de inventario"""
-        devolucion = self.devolucion_repo.get_by_id(devolucion_id)
+        devolucion = self.devolucion_repo.get_by_id_with_detalles(devolucion_id)
         if not devolucion:
             raise DevolucionNotFoundError(devolucion_id)
         
@@ -176,6 +193,8 @@ class DevolucionService:
                 })
         
         if productos_reintegro:
+            # La transacción de lectura se cierra antes de la llamada HTTP para no retener la conexión
+            self.db.commit()
             await self.external_service.crear_movimiento_entrada(
                 productos_reintegro,
                 f"DEVOLUCION_{devolucion.numero_devolucion}"
@@ -187,7 +206,7 @@ class DevolucionService:
             usuario
         )
         
-        self.external_service.encolar_tarea_pedido(
+        self.external_service.encolar_tarea_pedido_en_segundo_plano(
             devolucion.pedido_id,
             "devolucion_aprobada",
             {
@@ -197,7 +216,7 @@ class DevolucionService:
             }
         )
         
-        return DevolucionResponseDTO.from_orm(devolucion_aprobada)
+        return devolucion_response_desde_orm(devolucion_aprobada)
     
     def rechazar_devolucion(self, devolucion_id: int, usuario: str, motivo: str) -> DevolucionResponseDTO:
         """Rechazar una devolución"""
@@ -205,7 +224,7 @@ class DevolucionService:
         if not devolucion:
             raise DevolucionNotFoundError(devolucion_id)
         
-        if devolucion.estado not in ["recibida", "inspeccionada"]:
+        if devolucion.estado not in _ESTADOS_DEVOLUCION_RECHAZABLE:
             raise ValueError(f"Devolución debe estar 'recibida' o 'inspeccionada', actual: {devolucion.estado}")
         
         update_data = DevolucionUpdateDTO(
@@ -222,7 +241,7 @@ class DevolucionService:
             {"devolucion_id": devolucion_id, "motivo": motivo, "usuario": usuario}
         )
         
-        return DevolucionResponseDTO.from_orm(devolucion_rechazada)
+        return devolucion_response_desde_orm(devolucion_rechazada)
     
     async def procesar_devolucion(self, devolucion_id: int, usuario: str) -> DevolucionResponseDTO:
         """Procesar completamente una devolución aprobada"""
@@ -239,10 +258,10 @@ class DevolucionService:
             usuario
         )
         
-        self.external_service.encolar_tarea_pedido(
+        self.external_service.encolar_tarea_pedido_en_segundo_plano(
             devolucion.pedido_id,
             "devolucion_procesada",
             {"devolucion_id": devolucion_id, "procesador": usuario}
         )
         
-        return DevolucionResponseDTO.from_orm(devolucion_procesada)
+        return devolucion_response_desde_orm(devolucion_procesada)
@@ -15,10 +15,12 @@ from sqlalchemy.orm import Session
 from ..repositories.envio_repository import EnvioRepository
 from ..repositories.pedido_repository import PedidoRepository
 from ..services.external_service import ExternalService
-from ..dtos.envio_dto import EnvioCreateDTO, EnvioUpdateDTO, EnvioResponseDTO, EnvioListResponseDTO
+from ..dtos.envio_dto import EnvioCreateDTO, EnvioUpdateDTO, EnvioResponseDTO, EnvioListResponseDTO, envio_response_desde_orm
 from ..exceptions.api_exceptions import EnvioNotFoundError, PedidoNotFoundError, PedidoEstadoInvalidoError
 from ..config import settings
 
+_ESTADOS_PEDIDO_ENVIABLE = frozenset({"confirmado", "preparando"})
+
 class EnvioService:
     """Servicio para lógica de negocio de envíos"""
     
@@ -34,7 +36,7 @@ class EnvioService:
         if not pedido:
             raise PedidoNotFoundError(envio_data.pedido_id)
         
-        if pedido.estado not in ["confirmado", "preparando"]:
+        if pedido.estado not in _ESTADOS_PEDIDO_ENVIABLE:
             raise PedidoEstadoInvalidoError(
                 envio_data.pedido_id, 
                 pedido.estado, 
@@ -58,7 +60,7 @@ class EnvioService:
             }
         )
         
-        return EnvioResponseDTO.from_orm(envio)
+        return envio_response_desde_orm(envio)
     
     def obtener_envio(self, envio_id: int) -> EnvioResponseDTO:
         """Obtener un envío por ID"""
@@ -66,7 +68,7 @@ class EnvioService:
         if not envio:
             raise EnvioNotFoundError(envio_id)
         
-        return EnvioResponseDTO.from_orm(envio)
+        return envio_response_desde_orm(envio)
     
     def obtener_envio_por_numero(self, numero_envio: str) -> EnvioResponseDTO:
         """Obtener un envío por número"""
@@ -74,30 +76,43 @@ class EnvioService:
         if not envio:
             raise EnvioNotFoundError(f"Número: {numero_envio}")
         
-        return EnvioResponseDTO.from_orm(envio)
+        return envio_response_desde_orm(envio)
     
     def obtener_envios_pedido(self, pedido_id: int) -> List[EnvioResponseDTO]:
         """Obtener todos los envíos de un pedido"""
-        if not self.pedido_repo.get_by_id(pedido_id):
+        if not self.pedido_repo.exists(pedido_id):
             raise PedidoNotFoundError(pedido_id)
         
         envios = self.envio_repo.get_by_pedido(pedido_id)
-        return [EnvioResponseDTO.from_orm(envio) for envio in envios]
+        return [envio_response_desde_orm(envio) for envio in envios]
     
     def listar_envios(self, page: int = 1, page_size: int = 100, 
-                     estado: Optional[str] = None) -> EnvioListResponseDTO:
+                     estado: Optional[str] = None,
+                     include_total: bool = False, cursor: Optional[str] = None) -> EnvioListResponseDTO:
         """Listar envíos con filtros y paginación"""
-        skip = (page - 1) * page_size
-        envios = self.envio_repo.get_all(skip=skip, limit=page_size, estado=estado)
-        total = self.envio_repo.count(estado=estado)
-        
-        envios_dto = [EnvioResponseDTO.from_orm(envio) for envio in envios]
+        if cursor is None and page > 1:
+            # Paginación por número de página, conservada por compatibilidad
+            skip = (page - 1) * page_size
+            if include_total:
+                # El total llega con las filas de la página, en la misma consulta
+                envios, total = self.envio_repo.get_all_con_total(skip=skip, limit=page_size, estado=estado)
+            else:
+                envios, total = self.envio_repo.get_all(skip=skip, limit=page_size, estado=estado), None
+            next_cursor = None
+        else:
+            envios, next_cursor = self.envio_repo.get_page(cursor, page_size, estado=estado)
+            total = None
+        if include_total and total is None:
+            total = self.envio_repo.count(estado=estado)
+        
+        envios_dto = [envio_response_desde_orm(envio) for envio in envios]
         
         return EnvioListResponseDTO(
             envios=envios_dto,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
     
     def actualizar_envio(self, envio_id: int, envio_data: EnvioUpdateDTO) -> EnvioResponseDTO:
@@ -119,7 +134,7 @@ class EnvioService:
                 }
             )
         
-        return EnvioResponseDTO.from_orm(envio_actualizado)
+        return envio_response_desde_orm(envio_actualizado)
     
     def iniciar_transito(self, envio_id: int) -> EnvioResponseDTO:
         """Iniciar tránsito del envío"""
@@ -130,8 +145,8 @@ class EnvioService:
         if envio.estado != "programado":
             raise ValueError(f"Envío debe estar en estado 'programado', actual: {envio.estado}")
         
-        envio_actualizado = self.envio_repo.update_estado(envio_id, "en_transito")
-        
+        # Envío y pedido cambian de estado en una única transacción
+        envio_actualizado = self.envio_repo.update_estado(envio_id, "en_transito", commit=False)
         self.pedido_repo.update_estado(envio.pedido_id, "enviado")
         
         self.external_service.encolar_tarea_pedido(
@@ -140,7 +155,7 @@ class EnvioService:
             {"envio_id": envio_id, "numero_envio": envio.numero_envio}
         )
         
-        return EnvioResponseDTO.from_orm(envio_actualizado)
+        return envio_response_desde_orm(envio_actualizado)
     
     def marcar_entregado(self, envio_id: int) -> EnvioResponseDTO:
         """Marcar envío como entregado"""
@@ -151,8 +166,7 @@ class EnvioService:
         if envio.estado != "en_transito":
             raise ValueError(f"Envío debe estar 'en_transito', actual: {envio.estado}")
         
-        envio_actualizado = self.envio_repo.update_estado(envio_id, "entregado")
-        
+        envio_actualizado = self.envio_repo.update_estado(envio_id, "entregado", commit=False)
         self.pedido_repo.update_estado(envio.pedido_id, "entregado")
         
         self.external_service.encolar_tarea_pedido(
@@ -161,28 +175,22 @@ class EnvioService:
             {"envio_id": envio_id, "numero_envio": envio.numero_envio}
         )
         
-        return EnvioResponseDTO.from_orm(envio_actualizado)
+        return envio_response_desde_orm(envio_actualizado)
     
     def cancelar_envio(self, envio_id: int, motivo: str) -> EnvioResponseDTO:
         """Cancelar un envío"""
-        envio = self.envio_repo.get_by_id(envio_id)
-        if not envio:
-            raise EnvioNotFoundError(envio_id)
-        
-        if envio.estado in ["entregado", "cancelado"]:
+        envio_cancelado = self.envio_repo.cancelar(envio_id, motivo)
+        if not envio_cancelado:
+            # Solo se consulta el envío para informar el motivo del rechazo
+            envio = self.envio_repo.get_by_id(envio_id)
+            if not envio:
+                raise EnvioNotFoundError(envio_id)
             raise ValueError(f"No se puede cancelar envío en estado '{envio.estado}'")
         
-        update_data = EnvioUpdateDTO(
-            estado="cancelado",
-            observaciones=f"Cancelado: {motivo}"
-        )
-        
-        envio_actualizado = self.envio_repo.update(envio_id, update_data)
-        
         self.external_service.encolar_tarea_pedido(
-            envio.pedido_id,
+            envio_cancelado.pedido_id,
             "envio_cancelado",
             {"envio_id": envio_id, "motivo": motivo}
         )
         
-        return EnvioResponseDTO.from_orm(envio_actualizado)
+        return envio_response_desde_orm(envio_cancelado)
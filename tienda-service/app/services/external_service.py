@@ -9,64 +9,290 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
+import asyncio
+import functools
+import logging
 import httpx
 import redis
-import json
+import orjson
 import time
-from typing import List, Dict, Any, Optional
+import uuid
+from threading import Lock
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Awaitable, Callable, Deque, List, Dict, Any, Optional, Set, Tuple
 from decimal import Decimal
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
+from ..cache import redis_client, redis_async_client, cache_get, cache_get_many, cache_set, producto_catalogo_key
 from ..config import settings
-from ..exceptions.api_exceptions import ServicioExternoError
+from ..dtos.pedido_dto import DisponibilidadItemDTO
+from ..exceptions.api_exceptions import ServicioExternoError, ServicioNoDisponibleError
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCIA_CATALOGO = 20
+
+COLA_PEDIDOS = "cola_pedidos"
+# Tareas entregadas a un worker y pendientes de confirmación
+COLA_PEDIDOS_PROCESANDO = "cola_pedidos_procesando"
+# Momento en que un worker tomó cada tarea en procesamiento
+COLA_PEDIDOS_RECLAMADAS = "cola_pedidos_procesando:ts"
+
+# Pasa la tarea a procesamiento y anota la hora del servidor en la misma operación
+_RECLAMAR_TAREA = redis_client.register_script("""
+local payload = redis.call('LMOVE', KEYS[1], KEYS[2], 'RIGHT', 'LEFT')
+if payload then
+    local ahora = redis.call('TIME')
+    redis.call('ZADD', KEYS[3], ahora[1] + ahora[2] / 1000000, payload)
+end
+return payload
+""")
+
+# Devuelve a la cola las tareas tomadas hace más de ARGV[1] segundos que siguen sin confirmar
+_REENCOLAR_VENCIDAS = redis_client.register_script("""
+local ahora = redis.call('TIME')
+local limite = ahora[1] + ahora[2] / 1000000 - tonumber(ARGV[1])
+local reencoladas = 0
+for _, payload in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', limite)) do
+    redis.call('ZREM', KEYS[3], payload)
+    if redis.call('LREM', KEYS[2], 1, payload) == 1 then
+        redis.call('RPUSH', KEYS[1], payload)
+        reencoladas = reencoladas + 1
+    end
+end
+return reencoladas
+""")
+
+# Borra la marca solo si conserva el token de quien la tomó, por si venció y otro la adquirió
+_LIBERAR_MARCA = redis_async_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+# Encolados lanzados en segundo plano; la referencia evita que se recolecten antes de terminar
+MAX_TAREAS_PENDIENTES = 1000
+_tareas_pendientes: Set[asyncio.Task] = set()
+
+async def drenar_tareas_pendientes() -> None:
+    """Esperar los encolados en segundo plano aún en curso y cerrar el cliente asíncrono de Redis"""
+    if _tareas_pendientes:
+        await asyncio.gather(*_tareas_pendientes, return_exceptions=True)
+    await redis_async_client.aclose()
+
+def _payload_tarea(pedido_id: int, accion: str, datos: Dict[str, Any]) -> bytes:
+    """Serializar una tarea de la cola de pedidos"""
+    return orjson.dumps({
+        "pedido_id": pedido_id,
+        "accion": accion,
+        "datos": datos,
+        "timestamp": str(time.time())
+    }, default=str)
+
+def _es_fallo_transitorio(error: BaseException) -> bool:
+    """Errores de red o respuestas 5xx, que vale la pena reintentar"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+# Solo se reintentan las lecturas: repetir un POST de movimiento podría duplicarlo
+_reintentar_lectura = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.05, max=1),
+    retry=retry_if_exception(_es_fallo_transitorio),
+    reraise=True
+)
+
+class CircuitBreaker:
+    """Corta las llamadas a un servicio tras demasiados fallos transitorios en una
+    ventana de tiempo; al vencer la apertura deja pasar una sola llamada de prueba"""
+    
+    def __init__(self, servicio: str):
+        self.servicio = servicio
+        self._fallos: Deque[float] = deque()
+        self._abierto_hasta: Optional[float] = None
+        self._sondeando = False
+    
+    def _permitir(self) -> None:
+        if self._abierto_hasta is None:
+            return
+        if self._sondeando or time.monotonic() < self._abierto_hasta:
+            raise ServicioNoDisponibleError(self.servicio)
+        self._sondeando = True
+    
+    def _exito(self) -> None:
+        if self._abierto_hasta is not None:
+            logger.info("Circuito de %s cerrado", self.servicio)
+        self._abierto_hasta = None
+        self._sondeando = False
+    
+    def _fallo(self) -> None:
+        ahora = time.monotonic()
+        self._fallos.append(ahora)
+        while self._fallos[0] < ahora - settings.circuito_ventana:
+            self._fallos.popleft()
+        if self._sondeando or len(self._fallos) >= settings.circuito_umbral_fallos:
+            logger.warning("Circuito de %s abierto durante %ss", self.servicio, settings.circuito_apertura)
+            self._abierto_hasta = ahora + settings.circuito_apertura
+            self._sondeando = False
+            self._fallos.clear()
+    
+    @contextmanager
+    def proteger(self):
+        """Rechazar la llamada si el circuito está abierto y registrar su resultado"""
+        self._permitir()
+        try:
+            yield
+        except Exception as e:
+            if _es_fallo_transitorio(e):
+                self._fallo()
+            else:
+                # Un 4xx indica que el servicio responde
+                self._exito()
+            raise
+        except BaseException:
+            # Llamada cancelada: no dice nada del servicio, pero libera la prueba
+            self._sondeando = False
+            raise
+        else:
+            self._exito()
+
+_circuitos = {"almacen": CircuitBreaker("almacen"), "catalogo": CircuitBreaker("catalogo")}
+
+class StockAvailabilityLoader:
+    """Agrupa las consultas de stock concurrentes de distintas peticiones:
+    mientras una consulta de un par producto/almacén está en curso, las
+    siguientes esperan su mismo resultado en lugar de repetirla"""
+    
+    def __init__(self):
+        self._en_curso: Dict[Tuple[int, Optional[int]], asyncio.Future] = {}
+    
+    def load(self, consultar: Callable[[int, Optional[int]], Awaitable[Optional[float]]],
+             producto_id: int, almacen_id: Optional[int]) -> asyncio.Future:
+        """Obtener la cantidad disponible, compartiendo la consulta si ya hay una en curso"""
+        clave = (producto_id, almacen_id)
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(consultar(producto_id, almacen_id))
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._soltar(clave, tarea))
+        # La cancelación de un solicitante no debe cancelar la consulta de los demás
+        return asyncio.shield(tarea)
+    
+    def _soltar(self, clave: Tuple[int, Optional[int]], tarea: asyncio.Future) -> None:
+        if self._en_curso.get(clave) is tarea:
+            del self._en_curso[clave]
+
+stock_loader = StockAvailabilityLoader()
+
+# Cantidades disponibles consultadas hace poco, por par producto/almacén; solo se reutilizan
+# si cubren lo pedido, y una salida de stock las descarta
+_disponibilidad_reciente: TTLCache = TTLCache(maxsize=5000, ttl=settings.disponibilidad_cache_ttl)
+_disponibilidad_lock = Lock()
+
+def _olvidar_disponibilidad(producto_ids: Set[int]) -> None:
+    with _disponibilidad_lock:
+        for clave in [clave for clave in _disponibilidad_reciente if clave[0] in producto_ids]:
+            _disponibilidad_reciente.pop(clave, None)
 
 class ExternalService:
     """Servicio para comunicación con servicios externos"""
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
         self.almacen_base_url = f"{settings.almacen_service_url}/api/v1"
         self.catalogo_base_url = f"{settings.catalogo_service_url}/api"
-        self.redis_client = redis.from_url(settings.redis_url)
-        self.timeout = 30.0
+        self.redis_client = redis_client
+        self.http_client = http_client
+        self.timeout = httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+        self.stock_loader = stock_loader
+    
+    @asynccontextmanager
+    async def _cliente_http(self):
+        """Usar el cliente HTTP compartido o uno temporal si no fue inyectado"""
+        if self.http_client is not None:
+            yield self.http_client
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout,
+                                         transport=httpx.AsyncHTTPTransport(retries=3)) as client:
+                yield client
     
-    async def consultar_disponibilidad_stock(self, productos: List[Dict]) -> Dict[str, Any]:
+    @_reintentar_lectura
+    async def _get_json(self, client: httpx.AsyncClient, servicio: str, url: str,
+                        params: Optional[Dict[str, Any]] = None) -> Any:
+        """GET que devuelve el cuerpo JSON, con reintentos ante fallos transitorios"""
+        with _circuitos[servicio].proteger():
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+        return response.json()
+    
+    async def _post(self, client: httpx.AsyncClient, servicio: str, url: str, datos: Any) -> httpx.Response:
+        """POST sin reintentos, protegido por el circuito del servicio"""
+        with _circuitos[servicio].proteger():
+            response = await client.post(url, json=datos)
+            response.raise_for_status()
+        return response
+    
+    async def _consultar_stock(self, client: httpx.AsyncClient, producto_id: int,
+                               almacen_id: Optional[int]) -> Optional[float]:
+        """Consultar la cantidad disponible de un producto en un almacén"""
+        stock_data = await self._get_json(
+            client,
+            "almacen",
+            f"{self.almacen_base_url}/stock/",
+            params={
+                "producto_id": producto_id,
+                "almacen_id": almacen_id
+            }
+        )
+        items = stock_data["items"]
+        return float(items[0]["cantidad_disponible"]) if items else None
+    
+    @staticmethod
+    def _resultado_disponibilidad(producto: DisponibilidadItemDTO, disponible: Optional[float]) -> Dict[str, Any]:
+        """Comparar la cantidad requerida de una línea con el stock consultado"""
+        requerido = float(producto.cantidad)
+        return {
+            "producto_id": producto.producto_id,
+            "almacen_id": producto.almacen_id,
+            "cantidad_disponible": disponible or 0,
+            "cantidad_requerida": requerido,
+            "disponible": disponible is not None and disponible >= requerido
+        }
+    
+    async def consultar_disponibilidad_stock(self, productos: List[DisponibilidadItemDTO]) -> Dict[str, Any]:
         """Consultar disponibilidad de stock en el servicio de almacén"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+        async with self._cliente_http() as client:
             try:
-                # Consultar cada producto individualmente (principio KISS)
-                resultados = []
+                requerido: Dict[Tuple[int, Optional[int]], float] = {}
                 for producto in productos:
-                    response = await client.get(
-                        f"{self.almacen_base_url}/stock/",
-                        params={
-                            "producto_id": producto["producto_id"],
-                            "almacen_id": producto["almacen_id"]
-                        }
-                    )
-                    response.raise_for_status()
-                    stock_data = response.json()
-                    
-                    if stock_data["items"]:
-                        stock_info = stock_data["items"][0]
-                        disponible = float(stock_info["cantidad_disponible"])
-                        requerido = float(producto["cantidad"])
-                        
-                        resultados.append({
-                            "producto_id": producto["producto_id"],
-                            "almacen_id": producto["almacen_id"],
-                            "cantidad_disponible": disponible,
-                            "cantidad_requerida": requerido,
-                            "disponible": disponible >= requerido
-                        })
-                    else:
-                        resultados.append({
-                            "producto_id": producto["producto_id"],
-                            "almacen_id": producto["almacen_id"],
-                            "cantidad_disponible": 0,
-                            "cantidad_requerida": float(producto["cantidad"]),
-                            "disponible": False
-                        })
+                    par = (producto.producto_id, producto.almacen_id)
+                    requerido[par] = max(requerido.get(par, 0.0), float(producto.cantidad))
+                
+                with _disponibilidad_lock:
+                    recientes = {par: _disponibilidad_reciente.get(par) for par in requerido}
+                stock = {par: cantidad for par, cantidad in recientes.items()
+                         if cantidad is not None and cantidad >= requerido[par]}
                 
-                return {"productos": resultados}
+                # Una consulta por par producto/almacén sin disponibilidad reciente suficiente, en paralelo
+                pares = [par for par in requerido if par not in stock]
+                if self.http_client is not None:
+                    # Con el cliente compartido las consultas se unen a las de otras peticiones en curso
+                    consultar = functools.partial(self._consultar_stock, client)
+                    consultas = (self.stock_loader.load(consultar, *par) for par in pares)
+                else:
+                    consultas = (self._consultar_stock(client, *par) for par in pares)
+                cantidades = await asyncio.gather(*consultas)
+                consultado = {par: cantidad for par, cantidad in zip(pares, cantidades) if cantidad is not None}
+                with _disponibilidad_lock:
+                    _disponibilidad_reciente.update(consultado)
+                stock.update(zip(pares, cantidades))
+                return {"productos": [
+                    self._resultado_disponibilidad(producto, stock[(producto.producto_id, producto.almacen_id)])
+                    for producto in productos
+                ]}
             except httpx.RequestError as e:
                 raise ServicioExternoError("almacen", f"Error de conexión: {str(e)}")
             except httpx.HTTPStatusError as e:
@@ -74,38 +300,25 @@ class ExternalService:
     
     async def crear_movimiento_salida(self, productos: List[Dict], motivo: str) -> Dict[str, Any]:
         """Crear uno o múltiples movimientos de salida en el servicio de almacén"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+        async with self._cliente_http() as client:
             try:
-                # Preparar datos siguiendo el principio KISS
-                if len(productos) == 1:
-                    # Un solo movimiento - usar estructura simple
-                    movimiento_data = {
-                        "producto_id": productos[0]["producto_id"],
-                        "almacen_origen_id": productos[0]["almacen_origen_id"],
+                # Con varios productos el motivo identifica cada línea
+                multiple = len(productos) > 1
+                movimientos = [
+                    {
+                        "producto_id": producto["producto_id"],
+                        "almacen_origen_id": producto["almacen_origen_id"],
                         "tipo_movimiento": "salida",
-                        "cantidad": productos[0]["cantidad"],
-                        "motivo": motivo,
-                        "usuario": productos[0].get("usuario", "sistema")
+                        "cantidad": producto["cantidad"],
+                        "motivo": f"{motivo} - Producto {producto['producto_id']}" if multiple else motivo,
+                        "usuario": producto.get("usuario", "sistema")
                     }
-                else:
-                    # Múltiples movimientos - usar estructura de array
-                    movimientos = []
-                    for producto in productos:
-                        movimientos.append({
-                            "producto_id": producto["producto_id"],
-                            "almacen_origen_id": producto["almacen_origen_id"],
-                            "tipo_movimiento": "salida",
-                            "cantidad": producto["cantidad"],
-                            "motivo": f"{motivo} - Producto {producto['producto_id']}",
-                            "usuario": producto.get("usuario", "sistema")
-                        })
-                    movimiento_data = {"movimientos": movimientos}
+                    for producto in productos
+                ]
+                movimiento_data = {"movimientos": movimientos} if multiple else movimientos[0]
                 
-                response = await client.post(
-                    f"{self.almacen_base_url}/movimientos/salida",
-                    json=movimiento_data
-                )
-                response.raise_for_status()
+                response = await self._post(client, "almacen", f"{self.almacen_base_url}/movimientos/salida", movimiento_data)
+                _olvidar_disponibilidad({producto["producto_id"] for producto in productos})
                 return {"success": True, "data": response.json()}
             except httpx.RequestError as e:
                 raise ServicioExternoError("almacen", f"Error de conexión: {str(e)}")
@@ -114,53 +327,37 @@ class ExternalService:
     
     async def crear_movimiento_entrada(self, productos: List[Dict], motivo: str) -> Dict[str, Any]:
         """Crear uno o múltiples movimientos de entrada en el servicio de almacén"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+        async with self._cliente_http() as client:
             try:
-                # Preparar datos siguiendo el principio KISS
-                if len(productos) == 1:
-                    # Un solo movimiento
-                    movimiento_data = {
-                        "producto_id": productos[0]["producto_id"],
-                        "almacen_destino_id": productos[0]["almacen_destino_id"],
+                multiple = len(productos) > 1
+                movimientos = [
+                    {
+                        "producto_id": producto["producto_id"],
+                        "almacen_destino_id": producto["almacen_destino_id"],
                         "tipo_movimiento": "entrada",
-                        "cantidad": productos[0]["cantidad"],
-                        "motivo": motivo,
-                        "costo_unitario": productos[0].get("costo_unitario"),
-                        "usuario": productos[0].get("usuario", "sistema")
+                        "cantidad": producto["cantidad"],
+                        "motivo": f"{motivo} - Producto {producto['producto_id']}" if multiple else motivo,
+                        "costo_unitario": producto.get("costo_unitario"),
+                        "usuario": producto.get("usuario", "sistema")
                     }
-                else:
-                    # Múltiples movimientos
-                    movimientos = []
-                    for producto in productos:
-                        movimientos.append({
-                            "producto_id": producto["producto_id"],
-                            "almacen_destino_id": producto["almacen_destino_id"],
-                            "tipo_movimiento": "entrada",
-                            "cantidad": producto["cantidad"],
-                            "motivo": f"{motivo} - Producto {producto['producto_id']}",
-                            "costo_unitario": producto.get("costo_unitario"),
-                            "usuario": producto.get("usuario", "sistema")
-                        })
-                    movimiento_data = {"movimientos": movimientos}
+                    for producto in productos
+                ]
+                movimiento_data = {"movimientos": movimientos} if multiple else movimientos[0]
                 
-                response = await client.post(
-                    f"{self.almacen_base_url}/movimientos/entrada",
-                    json=movimiento_data
-                )
-                response.raise_for_status()
+                response = await self._post(client, "almacen", f"{self.almacen_base_url}/movimientos/entrada", movimiento_data)
                 return response.json()
             except httpx.RequestError as e:
                 raise ServicioExternoError("almacen", f"Error de conexión: {str(e)}")
             except httpx.HTTPStatusError as e:
                 raise ServicioExternoError("almacen", f"Error HTTP {e.response.status_code}: {e.response.text}")
     
-    async def obtener_producto_catalogo(self, producto_id: int) -> Dict[str, Any]:
-        """Obtener información de producto del catálogo"""
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+    async def _consultar_producto_catalogo(self, producto_id: int) -> Dict[str, Any]:
+        """Consultar un producto al servicio de catálogo y guardarlo en caché"""
+        async with self._cliente_http() as client:
             try:
-                response = await client.get(f"{self.catalogo_base_url}/productos/{producto_id}")
-                response.raise_for_status()
-                return response.json()
+                producto = await self._get_json(client, "catalogo", f"{self.catalogo_base_url}/productos/{producto_id}")
+                cache_set(producto_catalogo_key(producto_id), producto, settings.catalogo_cache_ttl)
+                return producto
             except httpx.RequestError as e:
                 raise ServicioExternoError("catalogo", f"Error de conexión: {str(e)}")
             except httpx.HTTPStatusError as e:
@@ -168,61 +365,111 @@ class ExternalService:
                     raise ServicioExternoError("catalogo", f"Producto {producto_id} no encontrado")
                 raise ServicioExternoError("catalogo", f"Error HTTP {e.response.status_code}: {e.response.text}")
     
+    async def obtener_producto_catalogo(self, producto_id: int) -> Dict[str, Any]:
+        """Obtener información de producto del catálogo"""
+        producto = cache_get(producto_catalogo_key(producto_id))
+        if producto is None:
+            producto = await self._consultar_producto_catalogo(producto_id)
+        return producto
+    
     async def obtener_productos_catalogo(self, producto_ids: List[int]) -> List[Dict[str, Any]]:
         """Obtener información de múltiples productos del catálogo"""
-        productos = []
-        for producto_id in producto_ids:
-            try:
-                producto = await self.obtener_producto_catalogo(producto_id)
-                productos.append(producto)
-            except ServicioExternoError:
-                productos.append({"id": producto_id, "error": "No encontrado"})
-        return productos
+        en_cache = cache_get_many([producto_catalogo_key(producto_id) for producto_id in producto_ids])
+        
+        # Solo los productos ausentes de la caché se piden al catálogo, acotando la concurrencia
+        limite = asyncio.Semaphore(CONCURRENCIA_CATALOGO)
+        
+        async def obtener(producto_id: int, producto: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            if producto is not None:
+                return producto
+            async with limite:
+                try:
+                    return await self._consultar_producto_catalogo(producto_id)
+                except ServicioExternoError:
+                    return {"id": producto_id, "error": "No encontrado"}
+        
+        return list(await asyncio.gather(*(
+            obtener(producto_id, producto) for producto_id, producto in zip(producto_ids, en_cache)
+        )))
     
     def encolar_tarea_pedido(self, pedido_id: int, accion: str, datos: Dict[str, Any]) -> bool:
         """Encolar tarea relacionada con pedido en Redis"""
         try:
-            tarea = {
-                "pedido_id": pedido_id,
-                "accion": accion,
-                "datos": datos,
-                "timestamp": str(time.time())
-            }
-            
-            self.redis_client.lpush("cola_pedidos", json.dumps(tarea, default=str))
+            self.redis_client.lpush(COLA_PEDIDOS, _payload_tarea(pedido_id, accion, datos))
             return True
         except Exception as e:
             raise ServicioExternoError("redis", f"Error al encolar tarea: {str(e)}")
     
-    def obtener_tarea_pedido(self) -> Optional[Dict[str, Any]]:
-        """Obtener tarea de la cola de pedidos"""
+    async def encolar_tarea_pedido_async(self, pedido_id: int, accion: str, datos: Dict[str, Any]) -> None:
+        """Encolar tarea con el cliente asíncrono de Redis; un fallo se registra sin propagarse"""
         try:
-            tarea_json = self.redis_client.brpop("cola_pedidos", timeout=1)
-            if tarea_json:
-                return json.loads(tarea_json[1])
-            return None
+            await redis_async_client.lpush(COLA_PEDIDOS, _payload_tarea(pedido_id, accion, datos))
+        except redis.RedisError as e:
+            logger.error("No se pudo encolar %s del pedido %s: %s", accion, pedido_id, e)
+    
+    def encolar_tarea_pedido_en_segundo_plano(self, pedido_id: int, accion: str, datos: Dict[str, Any]) -> None:
+        """Encolar tarea sin esperar a Redis; solo puede llamarse desde el bucle de eventos"""
+        if len(_tareas_pendientes) >= MAX_TAREAS_PENDIENTES:
+            # Redis no da abasto: se encola en línea y la petición absorbe la espera
+            logger.warning("Cola de encolados llena (%s), encolando %s del pedido %s en línea",
+                           len(_tareas_pendientes), accion, pedido_id)
+            self.encolar_tarea_pedido(pedido_id, accion, datos)
+            return
+        tarea = asyncio.create_task(self.encolar_tarea_pedido_async(pedido_id, accion, datos))
+        _tareas_pendientes.add(tarea)
+        tarea.add_done_callback(_tareas_pendientes.discard)
+    
+    def obtener_tarea_pedido(self) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Obtener tarea de la cola de pedidos, esperando hasta un segundo si está vacía
+        
+        La tarea pasa a la cola de procesamiento y permanece allí hasta que el worker
+        la confirma con confirmar_tarea_pedido usando el payload devuelto.
+        """
+        # Un script no puede bloquear como BLMOVE, así que la espera se hace sondeando
+        limite = time.monotonic() + 1
+        try:
+            while True:
+                payload = _RECLAMAR_TAREA(keys=[COLA_PEDIDOS, COLA_PEDIDOS_PROCESANDO, COLA_PEDIDOS_RECLAMADAS])
+                if payload:
+                    return orjson.loads(payload), payload
+                if time.monotonic() >= limite:
+                    return None
+                time.sleep(0.1)
         except Exception as e:
             raise ServicioExternoError("redis", f"Error al obtener tarea: {str(e)}")
     
-    def marcar_pedido_procesando(self, pedido_id: int) -> bool:
-        """Marcar pedido como en procesamiento en Redis"""
+    def confirmar_tarea_pedido(self, payload: bytes) -> bool:
+        """Retirar de la cola de procesamiento una tarea ya atendida"""
         try:
-            self.redis_client.setex(f"pedido_procesando:{pedido_id}", 300, "true")
-            return True
+            pipe = self.redis_client.pipeline()
+            pipe.lrem(COLA_PEDIDOS_PROCESANDO, 1, payload)
+            pipe.zrem(COLA_PEDIDOS_RECLAMADAS, payload)
+            retiradas, _ = pipe.execute()
+            return bool(retiradas)
         except Exception as e:
-            raise ServicioExternoError("redis", f"Error al marcar pedido: {str(e)}")
+            raise ServicioExternoError("redis", f"Error al confirmar tarea: {str(e)}")
     
-    def liberar_pedido_procesando(self, pedido_id: int) -> bool:
-        """Liberar marca de procesamiento de pedido"""
+    def reencolar_tareas_vencidas(self, antiguedad: float) -> int:
+        """Devolver a la cola de pedidos las tareas tomadas por un worker hace más de `antiguedad` segundos"""
         try:
-            self.redis_client.delete(f"pedido_procesando:{pedido_id}")
-            return True
+            return _REENCOLAR_VENCIDAS(
+                keys=[COLA_PEDIDOS, COLA_PEDIDOS_PROCESANDO, COLA_PEDIDOS_RECLAMADAS], args=[antiguedad]
+            )
         except Exception as e:
-            raise ServicioExternoError("redis", f"Error al liberar pedido: {str(e)}")
+            raise ServicioExternoError("redis", f"Error al reencolar tareas: {str(e)}")
     
-    def esta_pedido_procesando(self, pedido_id: int) -> bool:
-        """Verificar si un pedido está siendo procesado"""
+    async def adquirir_pedido_procesando(self, pedido_id: int) -> Optional[str]:
+        """Marcar pedido como en procesamiento si nadie lo tiene; devuelve el token de la marca o None"""
+        token = uuid.uuid4().hex
         try:
-            return self.redis_client.exists(f"pedido_procesando:{pedido_id}")
-        except Exception as e:
-            raise ServicioExternoError("redis", f"Error al verificar pedido: {str(e)}")
+            adquirido = await redis_async_client.set(f"pedido_procesando:{pedido_id}", token, nx=True, ex=300)
+        except redis.RedisError as e:
+            raise ServicioExternoError("redis", f"Error al marcar pedido: {str(e)}")
+        return token if adquirido else None
+    
+    async def liberar_pedido_procesando(self, pedido_id: int, token: str) -> bool:
+        """Liberar marca de procesamiento de pedido si sigue siendo la propia"""
+        try:
+            return bool(await _LIBERAR_MARCA(keys=[f"pedido_procesando:{pedido_id}"], args=[token]))
+        except redis.RedisError as e:
+            raise ServicioExternoError("redis", f"Error al liberar pedido: {str(e)}")
@@ -9,59 +9,104 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
+import asyncio
 from typing import List, Optional
+import httpx
+from fastapi import BackgroundTasks
 from sqlalchemy.orm import Session
 from decimal import Decimal
 
+from ..models.pedido import Pedido
 from ..repositories.pedido_repository import PedidoRepository, ReservaStockRepository
 from ..services.cliente_service import ClienteService
 from ..services.external_service import ExternalService
 from ..dtos.pedido_dto import (
     PedidoCreateDTO, PedidoUpdateDTO, PedidoConfirmarDTO,
-    PedidoResponseDTO, PedidoListResponseDTO
+    PedidoResponseDTO, PedidoListResponseDTO, PedidoCursoresResponseDTO, DisponibilidadItemDTO, pedido_response_desde_orm
 )
 from ..exceptions.api_exceptions import (
     PedidoNotFoundError, PedidoEstadoInvalidoError, StockInsuficienteError,
-    LimiteCreditoExcedidoError, NumeroPedidoExisteError, ServicioExternoError
+    LimiteCreditoExcedidoError, NumeroPedidoExisteError, ServicioExternoError, ServicioNoDisponibleError
 )
 from ..config import settings
 
+_ESTADOS_PEDIDO_EDITABLE = frozenset({"borrador", "pendiente"})
+
 class PedidoService:
     """Servicio para lógica de negocio de pedidos"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, http_client: Optional[httpx.AsyncClient] = None):
         self.db = db
         self.pedido_repo = PedidoRepository(db)
         self.reserva_repo = ReservaStockRepository(db)
         self.cliente_service = ClienteService(db)
-        self.external_service = ExternalService()
+        self.external_service = ExternalService(http_client)
     
-    async def crear_pedido(self, pedido_data: PedidoCreateDTO, usuario_creacion: str) -> PedidoResponseDTO:
-        """Crear un nuevo pedido con validaciones y reservas de stock"""
-        cliente = self.cliente_service.validar_cliente_activo(pedido_data.cliente_id)
-        
-        total_pedido = sum(
-            float(detalle.cantidad * detalle.precio_unitario - detalle.descuento_linea)
-            for detalle in pedido_data.detalles
-        )
-        
-        if not self.cliente_service.validar_limite_credito(pedido_data.cliente_id, total_pedido):
+    def _validar_cliente(self, cliente_id: int, total_pedido: Decimal) -> None:
+        """Validar que el cliente está activo y que el pedido cabe en su límite de crédito"""
+        # La proyección de crédito en Redis ya incluye el estado del cliente, sin consultar la tabla
+        suficiente, limite_credito = self.cliente_service.validar_limite_credito(cliente_id, total_pedido)
+        if not suficiente:
             raise LimiteCreditoExcedidoError(
-                pedido_data.cliente_id,
-                float(cliente.limite_credito),
-                total_pedido
+                cliente_id,
+                float(limite_credito),
+                float(total_pedido)
             )
+    
+    def _registrar_pedido(self, pedido_data: PedidoCreateDTO, usuario_creacion: str) -> Pedido:
+        """Guardar el pedido, sus detalles y sus reservas de stock en una sola transacción"""
+        numero_pedido = self.pedido_repo.get_next_numero(settings.numero_pedido_prefix)
         
-        productos_consulta = [
+        pedido = self.pedido_repo.create(pedido_data, numero_pedido, usuario_creacion, commit=False)
+        
+        self.reserva_repo.create_reservas(pedido.id, [
             {
                 "producto_id": detalle.producto_id,
-                "cantidad": float(detalle.cantidad),
+                "cantidad_reservada": detalle.cantidad,
                 "almacen_id": detalle.almacen_origen_id or pedido_data.almacen_origen_id
             }
             for detalle in pedido_data.detalles
+        ])
+        return pedido
+    
+    def _registrar_confirmacion(self, pedido_id: int, usuario_aprobacion: str) -> Optional[Pedido]:
+        """Marcar el pedido como confirmado si sigue en borrador y eliminar sus reservas en una sola transacción"""
+        pedido = self.pedido_repo.update_estado(
+            pedido_id, "confirmado", usuario_aprobacion, estado_requerido="borrador", commit=False
+        )
+        if pedido is None:
+            self.db.rollback()
+            return None
+        
+        self.reserva_repo.delete_reservas(pedido_id)
+        return pedido
+    
+    async def crear_pedido(self, pedido_data: PedidoCreateDTO, usuario_creacion: str) -> PedidoResponseDTO:
+        """Crear un nuevo pedido con validaciones y reservas de stock"""
+        total_pedido = sum(
+            (detalle.cantidad * detalle.precio_unitario - detalle.descuento_linea for detalle in pedido_data.detalles),
+            Decimal("0")
+        )
+        
+        productos_consulta = [
+            DisponibilidadItemDTO(
+                producto_id=detalle.producto_id,
+                cantidad=detalle.cantidad,
+                almacen_id=detalle.almacen_origen_id or pedido_data.almacen_origen_id
+            )
+            for detalle in pedido_data.detalles
         ]
         
-        disponibilidad = await self.external_service.consultar_disponibilidad_stock(productos_consulta)
+        # La validación del cliente corre en un hilo mientras se consulta el stock al almacén
+        validacion, disponibilidad = await asyncio.gather(
+            asyncio.to_thread(self._validar_cliente, pedido_data.cliente_id, total_pedido),
+            self.external_service.consultar_disponibilidad_stock(productos_consulta),
+            return_exceptions=True
+        )
+        # Los errores del cliente tienen prioridad sobre los del almacén
+        for resultado in (validacion, disponibilidad):
+            if isinstance(resultado, BaseException):
+                raise resultado
         
         for item in disponibilidad.get("productos", []):
             if not item.get("disponible", False):
@@ -71,25 +116,17 @@ class PedidoService:
                     item.get("cantidad_disponible", 0)
                 )
         
-        numero_pedido = self.pedido_repo.get_next_numero(settings.numero_pedido_prefix)
-        
-        pedido = self.pedido_repo.create(pedido_data, numero_pedido, usuario_creacion)
+        # Las escrituras síncronas de SQLAlchemy van a un hilo para no bloquear el event loop
+        pedido = await asyncio.to_thread(self._registrar_pedido, pedido_data, usuario_creacion)
+        numero_pedido = pedido.numero_pedido
         
-        for detalle in pedido_data.detalles:
-            self.reserva_repo.create_reserva(
-                pedido.id,
-                detalle.producto_id,
-                detalle.cantidad,
-                detalle.almacen_origen_id or pedido_data.almacen_origen_id
-            )
-        
-        self.external_service.encolar_tarea_pedido(
+        self.external_service.encolar_tarea_pedido_en_segundo_plano(
             pedido.id,
             "pedido_creado",
             {"numero_pedido": numero_pedido, "cliente_id": pedido_data.cliente_id}
         )
         
-        return PedidoResponseDTO.from_orm(pedido)
+        return pedido_response_desde_orm(pedido)
     
     def obtener_pedido(self, pedido_id: int) -> PedidoResponseDTO:
         """Obtener un pedido por ID"""
@@ -97,7 +134,7 @@ class PedidoService:
         if not pedido:
             raise PedidoNotFoundError(pedido_id)
         
-        return PedidoResponseDTO.from_orm(pedido)
+        return pedido_response_desde_orm(pedido)
     
     def obtener_pedido_por_numero(self, numero_pedido: str) -> PedidoResponseDTO:
         """Obtener un pedido por número"""
@@ -105,51 +142,76 @@ class PedidoService:
         if not pedido:
             raise PedidoNotFoundError(f"Número: {numero_pedido}")
         
-        return PedidoResponseDTO.from_orm(pedido)
+        return pedido_response_desde_orm(pedido)
     
     def listar_pedidos(self, page: int = 1, page_size: int = 100, 
-                      cliente_id: Optional[int] = None, estado: Optional[str] = None) -> PedidoListResponseDTO:
+                      cliente_id: Optional[int] = None, estado: Optional[str] = None,
+                      include_total: bool = False, cursor: Optional[str] = None) -> PedidoListResponseDTO:
         """Listar pedidos con filtros y paginación"""
-        skip = (page - 1) * page_size
-        pedidos = self.pedido_repo.get_all(skip=skip, limit=page_size, cliente_id=cliente_id, estado=estado)
-        total = self.pedido_repo.count(cliente_id=cliente_id, estado=estado)
+        if cursor is None and page > 1:
+            # Paginación por número de página, conservada por compatibilidad
+            skip = (page - 1) * page_size
+            if include_total:
+                pedidos, total = self.pedido_repo.get_all_con_total(skip=skip, limit=page_size,
+                                                                    cliente_id=cliente_id, estado=estado)
+            else:
+                pedidos, total = self.pedido_repo.get_all(skip=skip, limit=page_size, cliente_id=cliente_id, estado=estado), None
+            next_cursor = None
+        else:
+            pedidos, next_cursor = self.pedido_repo.get_page(cursor, page_size, cliente_id=cliente_id, estado=estado)
+            total = None
+        # Con cursor, o si la página pedida quedó fuera de rango, el total se cuenta aparte
+        if include_total and total is None:
+            total = self.pedido_repo.count(cliente_id=cliente_id, estado=estado)
         
-        pedidos_dto = [PedidoResponseDTO.from_orm(pedido) for pedido in pedidos]
+        pedidos_dto = [pedido_response_desde_orm(pedido) for pedido in pedidos]
         
         return PedidoListResponseDTO(
             pedidos=pedidos_dto,
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor
         )
     
+    def obtener_cursores_pedidos(self, page_size: int = 100, paginas: int = 2,
+                                 cliente_id: Optional[int] = None, estado: Optional[str] = None,
+                                 cursor: Optional[str] = None) -> PedidoCursoresResponseDTO:
+        """Obtener los cursores para descargar varias páginas de pedidos en paralelo"""
+        cursores = self.pedido_repo.get_cursores(cursor, page_size, paginas, cliente_id=cliente_id, estado=estado)
+        return PedidoCursoresResponseDTO(cursores=cursores, page_size=page_size)
+    
     def actualizar_pedido(self, pedido_id: int, pedido_data: PedidoUpdateDTO) -> PedidoResponseDTO:
         """Actualizar un pedido (solo en estados permitidos)"""
         pedido = self.pedido_repo.get_by_id(pedido_id)
         if not pedido:
             raise PedidoNotFoundError(pedido_id)
         
-        if pedido.estado not in ["borrador", "pendiente"]:
+        if pedido.estado not in _ESTADOS_PEDIDO_EDITABLE:
             raise PedidoEstadoInvalidoError(pedido_id, pedido.estado, "borrador o pendiente")
         
         pedido_actualizado = self.pedido_repo.update(pedido_id, pedido_data)
-        return PedidoResponseDTO.from_orm(pedido_actualizado)
+        return pedido_response_desde_orm(pedido_actualizado)
     
     async def confirmar_pedido(self, pedido_id: int, confirmacion_data: PedidoConfirmarDTO) -> PedidoResponseDTO:
         """Confirmar un pedido y ejecutar movimientos de stock"""
-        pedido = self.pedido_repo.get_by_id(pedido_id)
+        pedido = await asyncio.to_thread(self.pedido_repo.get_by_id, pedido_id)
         if not pedido:
             raise PedidoNotFoundError(pedido_id)
         
         if pedido.estado != "borrador":
             raise PedidoEstadoInvalidoError(pedido_id, pedido.estado, "borrador")
         
-        if self.external_service.esta_pedido_procesando(pedido_id):
+        token = await self.external_service.adquirir_pedido_procesando(pedido_id)
+        if token is None:
             raise PedidoEstadoInvalidoError(pedido_id, "procesando", "disponible")
         
-        self.external_service.marcar_pedido_procesando(pedido_id)
-        
         try:
+            # Otra petición pudo confirmar el pedido entre la lectura y la adquisición del token
+            estado_actual = await asyncio.to_thread(self.pedido_repo.get_estado, pedido_id)
+            if estado_actual != "borrador":
+                raise PedidoEstadoInvalidoError(pedido_id, estado_actual, "borrador")
+            
             productos_movimiento = [
                 {
                     "producto_id": detalle.producto_id,
@@ -165,53 +227,55 @@ class PedidoService:
             )
             
             if movimiento_result.get("success"):
-                pedido_confirmado = self.pedido_repo.update_estado(
-                    pedido_id, 
-                    "confirmado", 
+                pedido_confirmado = await asyncio.to_thread(
+                    self._registrar_confirmacion,
+                    pedido_id,
                     confirmacion_data.usuario_aprobacion
                 )
+                if pedido_confirmado is None:
+                    estado_actual = await asyncio.to_thread(self.pedido_repo.get_estado, pedido_id)
+                    raise PedidoEstadoInvalidoError(pedido_id, estado_actual, "borrador")
                 
-                self.reserva_repo.delete_reservas(pedido_id)
-                
-                self.external_service.encolar_tarea_pedido(
+                self.external_service.encolar_tarea_pedido_en_segundo_plano(
                     pedido_id,
                     "pedido_confirmado",
                     {"movimiento_id": movimiento_result.get("movimiento_id")}
                 )
                 
-                return PedidoResponseDTO.from_orm(pedido_confirmado)
+                return pedido_response_desde_orm(pedido_confirmado)
             else:
                 raise ServicioExternoError("almacen", "Error al procesar movimiento de stock")
         
+        except ServicioNoDisponibleError:
+            # El almacén no llegó a recibir el movimiento: el pedido sigue en borrador y puede reintentarse
+            raise
+        except PedidoEstadoInvalidoError:
+            # El pedido ya lo cambió otra petición; no se marca como fallido
+            raise
         except Exception as e:
-            self.pedido_repo.update_estado(pedido_id, "fallido")
+            await asyncio.to_thread(self.pedido_repo.update_estado, pedido_id, "fallido")
             raise e
         finally:
-            self.external_service.liberar_pedido_procesando(pedido_id)
+            await self.external_service.liberar_pedido_procesando(pedido_id, token)
     
-    def cancelar_pedido(self, pedido_id: int, motivo: str, usuario: str) -> PedidoResponseDTO:
+    def cancelar_pedido(self, pedido_id: int, motivo: str, usuario: str,
+                        background_tasks: Optional[BackgroundTasks] = None) -> PedidoResponseDTO:
         """Cancelar un pedido"""
-        pedido = self.pedido_repo.get_by_id(pedido_id)
-        if not pedido:
-            raise PedidoNotFoundError(pedido_id)
-        
-        if pedido.estado not in ["borrador", "pendiente", "confirmado"]:
+        pedido_cancelado = self.pedido_repo.cancelar(pedido_id, motivo, usuario)
+        if not pedido_cancelado:
+            # Solo se consulta el pedido para informar el motivo del rechazo
+            pedido = self.pedido_repo.get_by_id(pedido_id)
+            if not pedido:
+                raise PedidoNotFoundError(pedido_id)
             raise PedidoEstadoInvalidoError(pedido_id, pedido.estado, "borrador, pendiente o confirmado")
         
-        update_data = PedidoUpdateDTO(
-            estado="cancelado",
-            motivo_cancelacion=motivo,
-            usuario_aprobacion=usuario
-        )
-        
-        pedido_cancelado = self.pedido_repo.update(pedido_id, update_data)
-        
         self.reserva_repo.liberar_reservas(pedido_id)
         
-        self.external_service.encolar_tarea_pedido(
-            pedido_id,
-            "pedido_cancelado",
-            {"motivo": motivo, "usuario": usuario}
-        )
+        tarea = (pedido_id, "pedido_cancelado", {"motivo": motivo, "usuario": usuario})
+        if background_tasks is not None:
+            # Se encola después de enviar la respuesta
+            background_tasks.add_task(self.external_service.encolar_tarea_pedido, *tarea)
+        else:
+            self.external_service.encolar_tarea_pedido(*tarea)
         
-        return PedidoResponseDTO.from_orm(pedido_cancelado)
+        return pedido_response_desde_orm(pedido_cancelado)
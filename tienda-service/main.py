@@ -10,27 +10,75 @@
 # Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
 # ============================================================================
 
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+import httpx
 import uvicorn
 
 from app.config import settings
 from app.database import get_db, engine, Base
 from app.middleware.exception_handlers import setup_exception_handlers
+from app.services.external_service import drenar_tareas_pendientes
 
 from app.api.clientes import router as clientes_router
 from app.api.pedidos import router as pedidos_router
 from app.api.envios import router as envios_router
 from app.api.devoluciones import router as devoluciones_router
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# El esquema lo gestiona Alembic (alembic upgrade head); create_all queda solo para desarrollo local
+if settings.debug and settings.auto_create_all:
+    Base.metadata.create_all(bind=engine)
+
+async def precalentar_conexiones(client: httpx.AsyncClient) -> None:
+    """Abrir las conexiones con almacén y catálogo antes de recibir tráfico"""
+    resultados = await asyncio.gather(
+        client.get(f"{settings.almacen_service_url}/health", timeout=2.0),
+        client.head(settings.catalogo_service_url, timeout=2.0),
+        return_exceptions=True
+    )
+    for resultado in resultados:
+        if isinstance(resultado, Exception):
+            logger.warning("No se pudo precalentar la conexión: %s", resultado)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Gestión del ciclo de vida de la aplicación"""
+    # Cliente HTTP compartido hacia almacén y catálogo (reutiliza conexiones);
+    # el transporte reintenta solo los fallos al conectar, antes de enviar la petición
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+        transport=httpx.AsyncHTTPTransport(
+            retries=3,
+            limits=httpx.Limits(
+                max_keepalive_connections=settings.http_max_keepalive,
+                max_connections=settings.http_max_connections,
+                keepalive_expiry=settings.http_keepalive_expiry
+            )
+        )
+    )
+    await precalentar_conexiones(app.state.http_client)
+    
+    yield
+    
+    await app.state.http_client.aclose()
+    await drenar_tareas_pendientes()
 
 app = FastAPI(
     title="NutriChain Logistics - Tienda Service",
     description="Servicio para gestión de clientes, pedidos, envíos y devoluciones",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 setup_exception_handlers(app)
@@ -43,6 +91,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 app.include_router(clientes_router, prefix="/clientes", tags=["clientes"])
 app.include_router(pedidos_router, prefix="/pedidos", tags=["pedidos"])
 app.include_router(envios_router, prefix="/envios", tags=["envios"])
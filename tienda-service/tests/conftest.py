@@ -0,0 +1,14 @@
+# ============================================================================
+# conftest.py
+#
+# Configuración común de las pruebas del servicio de tienda. Las pruebas
+# unitarias no abren conexiones: basta un motor SQLite en memoria para poder
+# importar los módulos de la aplicación.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
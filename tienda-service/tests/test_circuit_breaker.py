@@ -0,0 +1,140 @@
+# ============================================================================
+# test_circuit_breaker.py
+#
+# Pruebas de las transiciones del circuito de servicios externos: apertura
+# por fallos en la ventana, llamada de prueba única al vencer la apertura y
+# cierre o reapertura según su resultado.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.exceptions.api_exceptions import ServicioNoDisponibleError
+from app.services import external_service
+from app.services.external_service import CircuitBreaker
+
+UMBRAL = 3
+VENTANA = 10.0
+APERTURA = 5.0
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+    def avanzar(self, segundos: float) -> None:
+        self.ahora += segundos
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(external_service.time, "monotonic", reloj)
+    monkeypatch.setattr(external_service.settings, "circuito_umbral_fallos", UMBRAL)
+    monkeypatch.setattr(external_service.settings, "circuito_ventana", VENTANA)
+    monkeypatch.setattr(external_service.settings, "circuito_apertura", APERTURA)
+    return reloj
+
+@pytest.fixture
+def circuito(reloj):
+    return CircuitBreaker("almacen")
+
+def _fallar(circuito: CircuitBreaker) -> None:
+    with pytest.raises(httpx.ConnectError):
+        with circuito.proteger():
+            raise httpx.ConnectError("sin conexión")
+
+def _responder(circuito: CircuitBreaker) -> None:
+    with circuito.proteger():
+        pass
+
+def _abrir(circuito: CircuitBreaker) -> None:
+    for _ in range(UMBRAL):
+        _fallar(circuito)
+
+def _rechazada(circuito: CircuitBreaker) -> bool:
+    try:
+        _responder(circuito)
+    except ServicioNoDisponibleError:
+        return True
+    return False
+
+def test_abre_al_alcanzar_el_umbral(circuito):
+    for _ in range(UMBRAL - 1):
+        _fallar(circuito)
+    assert not _rechazada(circuito)
+
+    _fallar(circuito)
+    assert _rechazada(circuito)
+
+def test_fallos_fuera_de_la_ventana_no_abren(circuito, reloj):
+    for _ in range(UMBRAL * 2):
+        _fallar(circuito)
+        reloj.avanzar(VENTANA / (UMBRAL - 1) + 0.1)
+    assert not _rechazada(circuito)
+
+def test_error_4xx_no_cuenta_como_fallo(circuito):
+    respuesta = httpx.Response(404, request=httpx.Request("GET", "http://almacen/stock"))
+    for _ in range(UMBRAL):
+        with pytest.raises(httpx.HTTPStatusError):
+            with circuito.proteger():
+                respuesta.raise_for_status()
+    assert not _rechazada(circuito)
+
+def test_una_sola_prueba_al_vencer_la_apertura(circuito, reloj):
+    _abrir(circuito)
+    reloj.avanzar(APERTURA - 0.1)
+    assert _rechazada(circuito)
+
+    reloj.avanzar(0.2)
+    prueba = circuito.proteger()
+    prueba.__enter__()
+    # Mientras la prueba está en curso, el resto de llamadas se rechaza
+    assert _rechazada(circuito)
+
+    prueba.__exit__(None, None, None)
+    assert not _rechazada(circuito)
+    assert not _rechazada(circuito)
+
+def test_prueba_fallida_reabre(circuito, reloj):
+    _abrir(circuito)
+    reloj.avanzar(APERTURA + 0.1)
+
+    # Un solo fallo de la prueba basta, aunque no alcance el umbral
+    _fallar(circuito)
+    assert _rechazada(circuito)
+
+    reloj.avanzar(APERTURA + 0.1)
+    _responder(circuito)
+    assert not _rechazada(circuito)
+
+def test_prueba_con_4xx_cierra(circuito, reloj):
+    _abrir(circuito)
+    reloj.avanzar(APERTURA + 0.1)
+
+    respuesta = httpx.Response(400, request=httpx.Request("POST", "http://almacen/movimientos"))
+    with pytest.raises(httpx.HTTPStatusError):
+        with circuito.proteger():
+            respuesta.raise_for_status()
+    assert not _rechazada(circuito)
+
+def test_prueba_cancelada_libera_el_turno(circuito, reloj):
+    _abrir(circuito)
+    reloj.avanzar(APERTURA + 0.1)
+
+    with pytest.raises(asyncio.CancelledError):
+        with circuito.proteger():
+            raise asyncio.CancelledError()
+
+    # La cancelación no cierra el circuito, pero la siguiente llamada puede hacer de prueba
+    prueba = circuito.proteger()
+    prueba.__enter__()
+    assert _rechazada(circuito)
+    prueba.__exit__(None, None, None)
+    assert not _rechazada(circuito)
@@ -0,0 +1,97 @@
+# ============================================================================
+# test_pagination.py
+#
+# Pruebas de la paginación por cursor: codificación del cursor, rechazo de
+# cursores inválidos y recorrido de páginas a través de las filas sin fecha.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import base64
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from app.exceptions.api_exceptions import ValidationError
+from app.repositories.pagination import cursores_keyset, decode_cursor, encode_cursor, paginar_keyset
+
+Base = declarative_base()
+
+class Fila(Base):
+    __tablename__ = "filas"
+
+    id = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, nullable=True)
+
+FECHAS = {
+    1: datetime(2026, 1, 1),
+    2: None,
+    3: datetime(2026, 1, 1),
+    4: datetime(2026, 1, 3),
+    5: None,
+    6: None,
+    7: datetime(2026, 1, 2),
+}
+# Sin fecha primero, luego fecha descendente; a igual fecha, ID descendente
+ORDEN_ESPERADO = [6, 5, 2, 4, 7, 3, 1]
+
+@pytest.fixture
+def sesion():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as sesion:
+        sesion.add_all(Fila(id=fila_id, fecha=fecha) for fila_id, fecha in FECHAS.items())
+        sesion.commit()
+        yield sesion
+
+def _recorrer(sesion, limit):
+    paginas, cursores, cursor = [], [None], None
+    while True:
+        filas, cursor = paginar_keyset(sesion.query(Fila), Fila.fecha, Fila.id, cursor, limit)
+        paginas.append([fila.id for fila in filas])
+        if cursor is None:
+            return paginas, cursores
+        cursores.append(cursor)
+
+@pytest.mark.parametrize("fecha", [datetime(2026, 3, 4, 5, 6, 7, 891011), None])
+def test_cursor_ida_y_vuelta(fecha):
+    assert decode_cursor(encode_cursor(fecha, 42)) == (fecha, 42)
+
+@pytest.mark.parametrize("cursor", [
+    "%%%",
+    base64.urlsafe_b64encode(b"sin-separador").decode(),
+    base64.urlsafe_b64encode(b"2026-01-01|no-es-id").decode(),
+    base64.urlsafe_b64encode(b"no-es-fecha|3").decode(),
+    base64.urlsafe_b64encode(b"a|b|c").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValidationError) as error:
+        decode_cursor(cursor)
+    assert error.value.details["field"] == "cursor"
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 7, 10])
+def test_recorrido_completo_sin_repetir_ni_saltar(sesion, limit):
+    paginas, _ = _recorrer(sesion, limit)
+    assert [fila_id for pagina in paginas for fila_id in pagina] == ORDEN_ESPERADO
+    assert all(len(pagina) == limit for pagina in paginas[:-1])
+
+def test_cursor_en_la_ultima_fila_sin_fecha(sesion):
+    filas, cursor = paginar_keyset(sesion.query(Fila), Fila.fecha, Fila.id, None, 3)
+    assert [fila.id for fila in filas] == [6, 5, 2]
+    assert decode_cursor(cursor) == (None, 2)
+
+    filas, _ = paginar_keyset(sesion.query(Fila), Fila.fecha, Fila.id, cursor, 3)
+    assert [fila.id for fila in filas] == [4, 7, 3]
+
+def test_cursor_entre_filas_sin_fecha(sesion):
+    filas, _ = paginar_keyset(sesion.query(Fila), Fila.fecha, Fila.id, encode_cursor(None, 5), 10)
+    assert [fila.id for fila in filas] == [2, 4, 7, 3, 1]
+
+def test_cursores_coinciden_con_el_recorrido(sesion):
+    _, cursores = _recorrer(sesion, 2)
+    calculados = cursores_keyset(sesion.query(Fila), Fila.fecha, Fila.id, None, 2, len(cursores))
+    assert calculados == cursores
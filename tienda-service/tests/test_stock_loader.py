@@ -0,0 +1,108 @@
+# ============================================================================
+# test_stock_loader.py
+#
+# Pruebas del agrupador de consultas de stock: las consultas concurrentes de
+# un mismo par producto/almacén comparten una sola llamada y la cancelación
+# de un solicitante no afecta a los demás.
+#
+# Este software está licenciado bajo la Licencia MIT.
+# Autor: Jorge Ernesto Remigio <jetradercu@yahoo.com>
+# ============================================================================
+
+import asyncio
+
+import pytest
+
+from app.services.external_service import StockAvailabilityLoader
+
+class ConsultaControlada:
+    """Consulta de stock que no termina hasta que la prueba la libera"""
+
+    def __init__(self, resultado=5.0, error=None):
+        self.llamadas = []
+        self.liberar = asyncio.Event()
+        self.resultado = resultado
+        self.error = error
+
+    async def __call__(self, producto_id, almacen_id):
+        self.llamadas.append((producto_id, almacen_id))
+        await self.liberar.wait()
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+@pytest.mark.asyncio
+async def test_consultas_concurrentes_comparten_llamada():
+    loader = StockAvailabilityLoader()
+    consulta = ConsultaControlada()
+
+    pendientes = [
+        loader.load(consulta, 1, 2),
+        loader.load(consulta, 1, 2),
+        loader.load(consulta, 1, None),
+    ]
+    await asyncio.sleep(0)
+    consulta.liberar.set()
+
+    assert await asyncio.gather(*pendientes) == [5.0, 5.0, 5.0]
+    assert consulta.llamadas == [(1, 2), (1, None)]
+
+@pytest.mark.asyncio
+async def test_consulta_terminada_no_se_reutiliza():
+    loader = StockAvailabilityLoader()
+    consulta = ConsultaControlada()
+    consulta.liberar.set()
+
+    assert await loader.load(consulta, 1, 2) == 5.0
+    await asyncio.sleep(0)
+    assert await loader.load(consulta, 1, 2) == 5.0
+    assert consulta.llamadas == [(1, 2), (1, 2)]
+
+@pytest.mark.asyncio
+async def test_cancelar_un_solicitante_no_cancela_a_los_demas():
+    loader = StockAvailabilityLoader()
+    consulta = ConsultaControlada()
+
+    cancelado = loader.load(consulta, 1, 2)
+    otro = loader.load(consulta, 1, 2)
+    await asyncio.sleep(0)
+    cancelado.cancel()
+    consulta.liberar.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await cancelado
+    assert await otro == 5.0
+    assert consulta.llamadas == [(1, 2)]
+
+@pytest.mark.asyncio
+async def test_consulta_sigue_si_todos_cancelan():
+    loader = StockAvailabilityLoader()
+    consulta = ConsultaControlada()
+
+    cancelado = loader.load(consulta, 1, 2)
+    await asyncio.sleep(0)
+    cancelado.cancel()
+
+    # Quien llega mientras tanto se une a la consulta que sigue en curso
+    tardio = loader.load(consulta, 1, 2)
+    consulta.liberar.set()
+    assert await tardio == 5.0
+    assert consulta.llamadas == [(1, 2)]
+
+@pytest.mark.asyncio
+async def test_error_llega_a_todos_y_libera_la_clave():
+    loader = StockAvailabilityLoader()
+    consulta = ConsultaControlada(error=RuntimeError("almacén caído"))
+
+    pendientes = [loader.load(consulta, 1, 2), loader.load(consulta, 1, 2)]
+    await asyncio.sleep(0)
+    consulta.liberar.set()
+
+    resultados = await asyncio.gather(*pendientes, return_exceptions=True)
+    assert all(isinstance(resultado, RuntimeError) for resultado in resultados)
+
+    await asyncio.sleep(0)
+    consulta.error = None
+    consulta.liberar.set()
+    assert await loader.load(consulta, 1, 2) == 5.0
+    assert consulta.llamadas == [(1, 2), (1, 2)]